@@ -1,5 +1,5 @@
 """
-Script principal para obtener y procesar información sobre centros educativos.
+Punto de entrada del servidor FastAPI y script para obtener y procesar información sobre centros educativos.
 Este script permite obtener datos de centros educativos desde una base de datos, calcular
 las distancias desde una dirección de origen hasta cada centro, y mostrar/exportar los
 resultados ordenados por tiempo de viaje.
@@ -8,17 +8,19 @@ Variables globales:
     provincia_destino (str): Provincia para filtrar los centros educativos (opcional)
 Flujo principal:
 1. Obtiene listado de centros educativos (filtrado por provincia o completo)
-2. Para cada centro:
-    - Crea objeto CentroEducativo
-    - Calcula distancia desde dirección origen
+2. Para cada centro crea un objeto CentroEducativo
+   y calcula las distancias desde la dirección origen (por lotes o de forma concurrente)
 3. Ordena centros por duración del trayecto
 4. Muestra resultados por consola
 5. Opcionalmente exporta resultados a CSV
 Dependencias:
     - services.ConexionJuntaPandas: Para consultas a la base de datos
     - models.CentroEducativo: Modelo de datos para centros educativos
-    - pandas: Para manejo de datos tabulares
-    - dotenv: Para gestión de variables de entorno
+    - fastapi: Para exponer la API (GET /api/centros y POST /api/centros/ordenar)
+Arranque:
+    Importar este módulo no carga pandas, googlemaps ni FastAPI: los servicios se importan
+    dentro de las funciones que los usan y la aplicación FastAPI se crea la primera vez que
+    se accede a `main.app` (por ejemplo, al arrancar con `uvicorn main:app`).
 Notas:
     - Los tiempos son calculados usando la API de Google Maps
     - Las distancias se muestran en kilómetros
@@ -26,14 +28,13 @@ Notas:
     - Las distancias y duraciones se muestran resaltadas en verde
 """
 
-from services.ConexionJuntaPandas import consulta_direccion_municipio_provincia, consulta_todos_centros
-from models.CentroEducativo import CentroEducativo
-import pandas as pd
+import argparse
+import logging
+import os
+import time
+from contextlib import asynccontextmanager
 
-# Importar dotenv_values desde dotenv para leer variables de entorno
-from dotenv import dotenv_values
-# Imprimir todas las variables de entorno cargadas del archivo .env
-print(dotenv_values())
+from services.metricas import obtener_metricas, cronometro, configurar_logging, perfilar
 
 # Dirección de origen proporcionada por el usuario
 direccion_origen = "Calle Costa Rica 49, 18194, Churriana de la Vega, Granada"
@@ -41,91 +42,388 @@ direccion_origen = "Calle Costa Rica 49, 18194, Churriana de la Vega, Granada"
 # Provincia de destino para filtrar los centros educativos
 provincia_destino = "Granada"
 
+# Fichero con el resumen de métricas de cada ejecución por línea de comandos
+RUTA_METRICAS = "metricas_ejecucion.json"
 
+logger = logging.getLogger(__name__)
 
-def creacion_csv_bil(direccion_origen):
 
-    """###-------------------------------------------------------------------------------------###"""
-    """###--- DATOS POR PROVINCIA ---###"""
-    # Obtener la lista de direcciones de centros en la provincia especificada
-    # direcciones_centros = consulta_direccion_municipio_provincia(provincia_destino)
+"""##-- SERVIDOR FASTAPI --##"""
+@asynccontextmanager
+async def lifespan(app):
+    import asyncio
+    from services.almacenCentros import obtener_almacen
+
+    # Cargar el listado de centros en memoria una sola vez al arrancar el servidor
+    await asyncio.to_thread(obtener_almacen)
+    yield
+
+
+def crear_app():
+    """Crea la aplicación FastAPI con el router de centros y CORS para el frontend."""
+    from fastapi import FastAPI
+    from fastapi.middleware.cors import CORSMiddleware
+    from routers.centros import router as centros_router
+
+    app = FastAPI(title="Centros Educativos", lifespan=lifespan)
+    # Permitir las llamadas del frontend (app.js), que se sirve desde otro origen
+    app.add_middleware(CORSMiddleware, allow_origins=["*"], allow_methods=["GET", "POST"], allow_headers=["*"])
+    app.include_router(centros_router)
+    return app
+
+
+def __getattr__(nombre):
+    # `main.app` se crea en el primer acceso, así que la línea de comandos no importa FastAPI
+    if nombre == "app":
+        globals()["app"] = crear_app()
+        return globals()["app"]
+    raise AttributeError(f"module {__name__!r} has no attribute {nombre!r}")
+
+
+
+# Fichero con los centros ya calculados, en el orden en que se resuelven sus rutas
+CSV_PARCIAL = "centros_educativos_parcial.csv"
+
+
+def calcular_con_csv_parcial(coleccion, centros, direccion_origen, trabajo=None, calculados=(), tam_bloque=None):
+    """
+    Calcula las distancias por lotes añadiendo al CSV parcial cada bloque de centros en
+    cuanto se resuelve, de modo que los primeros resultados se pueden consultar sin
+    esperar a que termine todo el cálculo.
+
+    Args:
+        coleccion (ColeccionCentros): Colección a la que pertenecen los centros
+        centros (list): Vistas de los centros de la colección
+        direccion_origen (str): Dirección desde la cual se calculan las distancias
+        trabajo (CheckpointTrabajo): Fichero de trabajo en el que se anota cada centro resuelto
+        calculados (list): Centros con resultado restaurado del trabajo, que se escriben primero
+        tam_bloque (int): Número de centros resueltos que se escriben de una vez (por defecto MAX_DESTINOS_POR_PETICION)
+
+    Returns:
+        dict: Código de centro -> motivo del fallo, para los centros sin resultado
+    """
+    from models.CentroEducativo import CentroEducativo
+    from services.googleConnect import MAX_DESTINOS_POR_PETICION
+
+    tam_bloque = tam_bloque or MAX_DESTINOS_POR_PETICION
+    fallidos = {}
+    pendientes = [centro.indice for centro in calculados]
+    escritos = 0
+    total = len(calculados) + len(centros)
+
+    def volcar():
+        nonlocal escritos
+        # Cabecera solo en el primer bloque; los siguientes se añaden al final del fichero
+        coleccion.tomar(pendientes).a_dataframe().to_csv(
+            CSV_PARCIAL, mode="w" if escritos == 0 else "a", header=escritos == 0, index=False, encoding='utf-8-sig')
+        escritos += len(pendientes)
+        pendientes.clear()
+
+    for centro in CentroEducativo.calcula_distancias_incremental(centros, direccion_origen):
+        if trabajo is not None:
+            trabajo.registrar(centro)
+        if centro.error_distancia is not None:
+            fallidos[centro.codigo_centro] = centro.error_distancia
+            continue
+        pendientes.append(centro.indice)
+        if len(pendientes) >= tam_bloque:
+            volcar()
+            logger.info("Centros calculados: %d de %d (resultados parciales en '%s')", escritos, total, CSV_PARCIAL)
+    if pendientes:
+        volcar()
+
+    return fallidos
+
+
+def calcular_concurrente_con_trabajo(centros, direccion_origen, trabajo, max_workers=None, tam_tanda=200):
+    """
+    Calcula las distancias de forma concurrente en tandas de `tam_tanda` centros,
+    anotando cada tanda en el fichero de trabajo antes de lanzar la siguiente.
+
+    Returns:
+        dict: Código de centro -> motivo del fallo, para los centros sin resultado
+    """
+    from models.CentroEducativo import CentroEducativo
+
+    fallidos = {}
+    for inicio in range(0, len(centros), tam_tanda):
+        tanda = centros[inicio:inicio + tam_tanda]
+        fallidos.update(CentroEducativo.calcula_distancias_concurrente(tanda, direccion_origen, max_workers))
+        for centro in tanda:
+            trabajo.registrar(centro)
+    return fallidos
+
+
+def creacion_csv_bil(direccion_origen, modo="lote", max_workers=None, top_n=None, k=20, provincia=None, radio_km=None,
+                     reanudar=False, mostrar=True, ruta_metricas=RUTA_METRICAS):
+    """
+    Calcula las distancias desde `direccion_origen` hasta los centros, las muestra
+    ordenadas por duración y las exporta a CSV.
+
+    Args:
+        direccion_origen (str): Dirección desde la cual se calculan las distancias
+        modo (str): 'lote' agrupa los destinos en peticiones por lotes a Distance Matrix y va
+                    añadiendo a CSV_PARCIAL los centros según se resuelven;
+                    'concurrente' lanza una consulta por centro en un pool de hilos;
+                    'offline' ordena por un tiempo estimado a partir de las coordenadas;
+                    'topk' devuelve solo los `k` centros más cercanos consultando el mínimo de rutas;
+                    'tabla' ordena por los tiempos precalculados desde el código postal del origen
+                    (sin consultar a Google Maps) y, si el código postal no está en la tabla, usa 'lote'
+        max_workers (int): Número máximo de consultas simultáneas en el modo 'concurrente' (por defecto GOOGLE_MAPS_MAX_WORKERS)
+        top_n (int): En el modo 'offline', número de centros a afinar con Google Maps
+        k (int): En el modo 'topk', número de centros a devolver
+        provincia (str): Provincia de los centros bilingües a consultar; sin provincia se usan todos los centros
+        radio_km (float): Consultar solo los centros a menos de esta distancia en línea recta del origen
+                          (los centros sin coordenadas en la caché se conservan)
+        reanudar (bool): En los modos 'lote' y 'concurrente', continuar el trabajo guardado en
+                         CHECKPOINT_TRABAJO_PATH sin volver a calcular los centros que ya tienen resultado
+        mostrar (bool): Mostrar cada centro ordenado por consola
+        ruta_metricas (str): Fichero JSON en el que se guarda el resumen de métricas (None para no guardarlo)
+    """
+    from services.ConexionJuntaPandas import consulta_direccion_municipio_provincia, consulta_todos_centros, obtener_dataframe_centros
+    from models.ColeccionCentros import ColeccionCentros
+    from services.cacheRutas import obtener_cache
+    from services.checkpointTrabajo import CheckpointTrabajo
+    from services.estimadorOffline import filtrar_por_radio, ordenar_centros_offline, ordenar_top_k
+    from services.tablaCodigosPostales import ordenar_por_tabla
+
+    metricas = obtener_metricas()
+    metricas.reiniciar()
+    inicio = time.perf_counter()
 
-    """###--- LISTADO COMPLETO ---###"""
-    # Obtener la lista de direcciones de TODOS los centros sin filtro de provincia
-    direcciones_centros = consulta_todos_centros()
+    # Descargar (o leer de la copia local) el listado completo una sola vez
+    with cronometro("junta"):
+        obtener_dataframe_centros()
+
+    """###-------------------------------------------------------------------------------------###"""
+    with cronometro("filtrado"):
+        if provincia:
+            """###--- DATOS POR PROVINCIA ---###"""
+            # Obtener la lista de direcciones de centros en la provincia especificada
+            direcciones_centros = consulta_direccion_municipio_provincia(provincia)
+        else:
+            """###--- LISTADO COMPLETO ---###"""
+            # Obtener la lista de direcciones de TODOS los centros sin filtro de provincia
+            direcciones_centros = consulta_todos_centros()
     """###-------------------------------------------------------------------------------------###"""
 
     # Asegurarnos de que tenemos al menos una dirección
     if not direcciones_centros.empty:
-        # Lista para almacenar los objetos de centros educativos
-        centros_educativos = []
-        
-        # Iterar sobre todas las direcciones de la lista y crear objetos CentroEducativo
-        for i, row in direcciones_centros.iterrows():
-            centro = CentroEducativo(
-                direccion=row["D_DOMICILIO"],
-                codigo_postal = row["C_POSTAL"],
-                municipio=row["D_MUNICIPIO"],
-                provincia=row["D_PROVINCIA"],
-                tipo_centro=row["D_DENOMINA"],
-                nombre_centro=row["D_ESPECIFICA"],
-                codigo_centro = row["codigo"],
-                publico_privado = row["D_TIPO"],
-                bil = row["ESO"],
-                compensatoria="No"
-            )
-            
-            # Calcular la distancia desde la dirección de origen
-            if centro.calcula_distancia_clase(direccion_origen):
-                centros_educativos.append(centro)
-        
-
-        # Ordenar los centros por duración estimada (convertida a minutos)
-        centros_educativos_ordenados = sorted(centros_educativos, key=lambda x: CentroEducativo.convertir_duracion_a_minutos(x.duracion) if x.duracion is not None else float('inf'))
+        # Guardar los centros por columnas y trabajar con vistas ligeras sobre cada fila
+        with cronometro("construccion"):
+            coleccion = ColeccionCentros.desde_dataframe(direcciones_centros, compensatoria="No")
+            centros = coleccion.vistas()
+
+        if radio_km:
+            # Descartar los centros fuera del radio (en línea recta) antes de consultar rutas
+            with cronometro("filtrado"):
+                cercanos = filtrar_por_radio(direccion_origen, centros, radio_km)
+                coleccion = coleccion.tomar([centro.indice for centro in cercanos])
+                centros = coleccion.vistas()
+            logger.info("Centros a menos de %s km del origen: %d de %d", radio_km, len(centros), len(direcciones_centros))
+
+        if modo == "tabla":
+            # Búsqueda en la tabla precalculada desde el código postal del origen, sin consultas a Google Maps
+            with cronometro("rutas"):
+                ordenados = ordenar_por_tabla(direccion_origen, centros)
+            if ordenados is None:
+                logger.info("El código postal de '%s' no está en la tabla precalculada; se calculan las rutas por lotes", direccion_origen)
+                modo = "lote"
+
+        if modo == "tabla":
+            with cronometro("ordenacion"):
+                centros_educativos_ordenados = coleccion.tomar([centro.indice for centro in ordenados])
+        elif modo == "offline":
+            # Ordenar por el tiempo estimado a partir de las coordenadas (solo se afinan con Google los `top_n` primeros)
+            with cronometro("rutas"):
+                ordenados = ordenar_centros_offline(direccion_origen, centros, top_n)
+            with cronometro("ordenacion"):
+                centros_educativos_ordenados = coleccion.tomar([centro.indice for centro in ordenados])
+        elif modo == "topk":
+            # Consultar rutas por orden de cota inferior hasta que ningún centro restante pueda entrar en los k mejores
+            with cronometro("rutas"):
+                ordenados, consultados = ordenar_top_k(direccion_origen, centros, k)
+            logger.info("Rutas consultadas para obtener los %d centros más cercanos: %d de %d", k, consultados, len(centros))
+            with cronometro("ordenacion"):
+                centros_educativos_ordenados = coleccion.tomar([centro.indice for centro in ordenados])
+        else:
+            # Recuperar del fichero de trabajo los centros ya calculados en una ejecución anterior
+            filtros = {"provincia": provincia}
+            if radio_km:
+                filtros["radio_km"] = radio_km
+            trabajo = CheckpointTrabajo.abrir(direccion_origen, filtros, reanudar)
+            calculados, pendientes = trabajo.restaurar(centros)
+            if calculados:
+                logger.info("Reanudando el trabajo: %d centros ya calculados, %d pendientes", len(calculados), len(pendientes))
+
+            # Calcular las distancias desde la dirección de origen (por lotes o de forma concurrente)
+            with cronometro("rutas"):
+                if modo == "concurrente":
+                    fallidos = calcular_concurrente_con_trabajo(pendientes, direccion_origen, trabajo, max_workers)
+                else:
+                    fallidos = calcular_con_csv_parcial(coleccion, pendientes, direccion_origen, trabajo, calculados)
+                trabajo.guardar(terminado=True)
+            for codigo_centro, motivo in fallidos.items():
+                logger.warning("No se pudo calcular la distancia para el centro %s: %s", codigo_centro, motivo)
+
+            # Ordenar los centros con distancia calculada por su duración numérica en segundos
+            with cronometro("ordenacion"):
+                centros_educativos_ordenados = coleccion.ordenar_por_duracion(solo_calculados=True)
 
 
         """###--- MOSTRAR DATOS ---###"""
         # Mostrar los resultados ordenados
-        for centro in centros_educativos_ordenados:
-            #Resalta el codigo por consola
-            codigo_centro_resaltado = f"\033[93m{centro.codigo_centro}\033[0m" 
-            distancia_resaltada = f"\033[92m{centro.distancia_km}\033[0m"
-            duracion_resaltada = f"\033[92m{centro.duracion}\033[0m"
+        if mostrar:
+            with cronometro("salida"):
+                for centro in centros_educativos_ordenados:
+                    #Resalta el codigo por consola
+                    codigo_centro_resaltado = f"\033[93m{centro.codigo_centro}\033[0m" 
+                    # Sin ruta calculada (modo 'offline') se muestran los valores estimados
+                    distancia = centro.distancia_km if centro.distancia_km is not None else f"~{centro.distancia_estimada_km} km"
+                    duracion = centro.duracion if centro.duracion is not None else f"~{centro.duracion_estimada_min} min"
+                    distancia_resaltada = f"\033[92m{distancia}\033[0m"
+                    duracion_resaltada = f"\033[92m{duracion}\033[0m"
 
-            print(f"\n##-- Código:{codigo_centro_resaltado}-Centro {centro.publico_privado} {centro.tipo_centro } {centro.bil}-{ centro.nombre_centro}||{centro.municipio},{centro.provincia} --##")
-            #print(f"Distancia desde '{direccion_origen}' hasta '{centro.direccion}, {centro.municipio}, {centro.provincia}':")
-            print(f"- Distancia: {distancia_resaltada}")
-            print(f"- Duración estimada: {duracion_resaltada}")
+                    print(f"\n##-- Código:{codigo_centro_resaltado}-Centro {centro.publico_privado} {centro.tipo_centro } {centro.bil}-{ centro.nombre_centro}||{centro.municipio},{centro.provincia} --##")
+                    #print(f"Distancia desde '{direccion_origen}' hasta '{centro.direccion}, {centro.municipio}, {centro.provincia}':")
+                    print(f"- Distancia: {distancia_resaltada}")
+                    print(f"- Duración estimada: {duracion_resaltada}")
 
         """###--- EXPORTAR DATOS ---###"""
-        # Crear un DataFrame para exportar los resultados
-        datos_exportar = []
-        for centro in centros_educativos_ordenados:
-            datos_exportar.append({
-                "Código Centro": centro.codigo_centro,
-                "Tipo Centro": centro.tipo_centro,
-                "Nombre Centro": centro.nombre_centro,
-                "Público/Privado": centro.publico_privado,
-                "Dirección": centro.direccion,
-                "Código Postal": centro.codigo_postal,
-                "Municipio": centro.municipio,
-                "Provincia": centro.provincia,
-                "Distancia (Km)": centro.distancia_km,
-                "Duración": centro.duracion,
-                "Idiomas": centro.bil
-            })
-
-        df_exportar = pd.DataFrame(datos_exportar)
-        
-        # Exportar el DataFrame a un archivo CSV
-        df_exportar.to_csv("centros_educativos_ordenados.csv", index=False, encoding='utf-8-sig')
-        print("Los datos se han exportado correctamente a 'centros_educativos_ordenados.csv'")
+        with cronometro("exportacion"):
+            # Crear el DataFrame de exportación directamente desde las columnas de la colección
+            df_exportar = centros_educativos_ordenados.a_dataframe()
+
+            # Exportar el DataFrame a un archivo CSV
+            df_exportar.to_csv("centros_educativos_ordenados.csv", index=False, encoding='utf-8-sig')
+        logger.info("Los datos se han exportado correctamente a 'centros_educativos_ordenados.csv'")
+
+        # El CSV ordenado sustituye a los resultados parciales
+        if os.path.exists(CSV_PARCIAL):
+            os.remove(CSV_PARCIAL)
+
+    else:
+        logger.warning("No se encontraron direcciones de centros en la provincia especificada.")
+
+    # Resumen de la ejecución: tiempo por etapa, llamadas a las APIs y uso de la caché de rutas
+    metricas.registrar_tiempo("total", time.perf_counter() - inicio)
+    resumen = {**metricas.resumen(), "cache": obtener_cache().estadisticas(), "origen": direccion_origen, "modo": modo,
+               "centros": len(direcciones_centros)}
+    logger.info("Resumen de la ejecución: %s", resumen)
+    if ruta_metricas:
+        metricas.guardar(ruta_metricas, cache=resumen["cache"], origen=direccion_origen, modo=modo, centros=resumen["centros"])
+    return resumen
+
 
 
+def creacion_csv_multiorigen(direcciones_origen, provincia=None, radio_km=None, mostrar=True, ruta_metricas=RUTA_METRICAS):
+    """
+    Compara varias direcciones de origen frente a los mismos centros en una sola pasada
+    y exporta una tabla con los minutos desde cada origen, el mínimo y la media.
+
+    El listado de centros se obtiene una única vez y las rutas se calculan con
+    peticiones a Distance Matrix de varios orígenes a la vez.
+
+    Args:
+        direcciones_origen (list): Direcciones de origen a comparar
+        provincia (str): Provincia de los centros bilingües a consultar; sin provincia se usan todos los centros
+        radio_km (float): Consultar solo los centros a menos de esta distancia en línea recta de
+                          alguno de los orígenes (los centros sin coordenadas en la caché se conservan)
+        mostrar (bool): Mostrar por consola los 20 primeros centros de la tabla
+        ruta_metricas (str): Fichero JSON en el que se guarda el resumen de métricas (None para no guardarlo)
+    """
+    from services.ConexionJuntaPandas import consulta_direccion_municipio_provincia, consulta_todos_centros, obtener_dataframe_centros
+    from models.ColeccionCentros import ColeccionCentros
+    from services.cacheRutas import obtener_cache
+    from services.estimadorOffline import filtrar_por_radio
+
+    metricas = obtener_metricas()
+    metricas.reiniciar()
+    inicio = time.perf_counter()
+
+    with cronometro("junta"):
+        obtener_dataframe_centros()
+    with cronometro("filtrado"):
+        direcciones_centros = consulta_direccion_municipio_provincia(provincia) if provincia else consulta_todos_centros()
+
+    if not direcciones_centros.empty:
+        with cronometro("construccion"):
+            coleccion = ColeccionCentros.desde_dataframe(direcciones_centros, compensatoria="No")
+
+        if radio_km:
+            # Conservar los centros que están dentro del radio de al menos uno de los orígenes
+            with cronometro("filtrado"):
+                centros = coleccion.vistas()
+                cercanos = set()
+                for direccion_origen in direcciones_origen:
+                    cercanos.update(centro.indice for centro in filtrar_por_radio(direccion_origen, centros, radio_km))
+                coleccion = coleccion.tomar(sorted(cercanos))
+            logger.info("Centros a menos de %s km de algún origen: %d de %d", radio_km, len(coleccion), len(direcciones_centros))
+
+        with cronometro("rutas"):
+            segundos, fallidos = coleccion.calcula_matriz_duraciones(direcciones_origen)
+        for (indice_origen, codigo_centro), motivo in fallidos.items():
+            logger.warning("No se pudo calcular la distancia desde '%s' para el centro %s: %s", direcciones_origen[indice_origen], codigo_centro, motivo)
+
+        with cronometro("ordenacion"):
+            df_exportar = coleccion.a_dataframe_multiorigen(direcciones_origen, segundos)
+
+        """###--- MOSTRAR DATOS ---###"""
+        if mostrar:
+            with cronometro("salida"):
+                for _, fila in df_exportar.head(20).iterrows():
+                    # Sin ruta desde todos los orígenes no hay media comparable
+                    media = f"{fila['Media (min)']} min" if fila["Orígenes con ruta"] == len(direcciones_origen) else \
+                        f"sin calcular ({fila['Orígenes con ruta']} de {len(direcciones_origen)} orígenes)"
+                    print(f"\n##-- Código:\033[93m{fila['Código Centro']}\033[0m-{fila['Nombre Centro']}||{fila['Municipio']},{fila['Provincia']} --##")
+                    print(f"- Mínimo: \033[92m{fila['Mínimo (min)']} min\033[0m desde '{fila['Origen más cercano']}'")
+                    print(f"- Media: \033[92m{media}\033[0m")
+
+        """###--- EXPORTAR DATOS ---###"""
+        with cronometro("exportacion"):
+            df_exportar.to_csv("centros_educativos_multiorigen.csv", index=False, encoding='utf-8-sig')
+        logger.info("Los datos se han exportado correctamente a 'centros_educativos_multiorigen.csv'")
     else:
-        print("No se encontraron direcciones de centros en la provincia especificada.")
+        logger.warning("No se encontraron direcciones de centros en la provincia especificada.")
 
+    # Resumen de la ejecución, igual que en creacion_csv_bil
+    metricas.registrar_tiempo("total", time.perf_counter() - inicio)
+    resumen = {**metricas.resumen(), "cache": obtener_cache().estadisticas(), "origen": list(direcciones_origen),
+               "modo": "multiorigen", "centros": len(direcciones_centros)}
+    logger.info("Resumen de la ejecución: %s", resumen)
+    if ruta_metricas:
+        metricas.guardar(ruta_metricas, cache=resumen["cache"], origen=resumen["origen"], modo="multiorigen", centros=resumen["centros"])
+    return resumen
 
 
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Ordena los centros educativos por tiempo de viaje desde una dirección.")
+    parser.add_argument("--origen", nargs="+", default=[direccion_origen],
+                        help="Dirección de origen; con varias se comparan todas frente a los mismos centros")
+    parser.add_argument("--modo", choices=["lote", "concurrente", "offline", "topk", "tabla"], default="lote")
+    parser.add_argument("--provincia", default=None, help="Consultar solo los centros bilingües de esta provincia")
+    parser.add_argument("--radio-km", type=float, default=None, help="Consultar solo los centros a menos de estos kilómetros en línea recta")
+    parser.add_argument("--max-workers", type=int, default=None, help="Consultas simultáneas en el modo 'concurrente' (por defecto GOOGLE_MAPS_MAX_WORKERS)")
+    parser.add_argument("--top-n", type=int, default=None, help="Centros a afinar con Google Maps en el modo 'offline'")
+    parser.add_argument("-k", type=int, default=20, help="Centros a devolver en el modo 'topk'")
+    parser.add_argument("--resume", action="store_true", help="Continuar el trabajo interrumpido sin repetir los centros ya calculados")
+    parser.add_argument("--silencioso", action="store_true", help="No mostrar cada centro por consola (solo el CSV y el resumen)")
+    parser.add_argument("--log-level", default=None, help="Nivel de los mensajes: DEBUG, INFO, WARNING... (por defecto LOG_LEVEL)")
+    parser.add_argument("--metricas", default=RUTA_METRICAS, help="Fichero JSON con el resumen de métricas de la ejecución")
+    parser.add_argument("--perfil", default=None, help="Ejecutar bajo cProfile y guardar las estadísticas en este fichero")
+    argumentos = parser.parse_args()
 
+    # Con varios orígenes no hay modos de cálculo ni fichero de trabajo que reanudar
+    if len(argumentos.origen) > 1 and (argumentos.modo != "lote" or argumentos.resume):
+        parser.error("--modo y --resume solo se admiten con un único --origen")
 
+    configurar_logging(argumentos.log_level)
+    with perfilar(argumentos.perfil):
+        if len(argumentos.origen) > 1:
+            # Varios orígenes: una sola pasada con peticiones de varios orígenes a la vez
+            creacion_csv_multiorigen(argumentos.origen, provincia=argumentos.provincia, radio_km=argumentos.radio_km,
+                                     mostrar=not argumentos.silencioso, ruta_metricas=argumentos.metricas)
+        else:
+            creacion_csv_bil(argumentos.origen[0], modo=argumentos.modo, max_workers=argumentos.max_workers, top_n=argumentos.top_n,
+                             k=argumentos.k, provincia=argumentos.provincia, radio_km=argumentos.radio_km, reanudar=argumentos.resume,
+                             mostrar=not argumentos.silencioso, ruta_metricas=argumentos.metricas)
@@ -1,7 +1,19 @@
-from services.googleConnect import calcular_distancias
+from services.googleConnect import calcular_distancias, calcular_distancias_lote, calcular_distancias_concurrente, iterar_distancias_lote
+from services.normalizacionDirecciones import clave_destino
+import logging
 import re
 
+logger = logging.getLogger(__name__)
+
 class CentroEducativo:
+    # Atributos fijos: sin __dict__ por instancia para reducir memoria al manejar miles de centros
+    __slots__ = (
+        "direccion", "codigo_postal", "municipio", "provincia", "codigo_centro", "nombre_centro",
+        "tipo_centro", "publico_privado", "bil", "compensatoria",
+        "distancia_km", "distancia_m", "duracion", "duracion_s", "error_distancia",
+        "latitud", "longitud", "distancia_estimada_km", "duracion_estimada_min",
+    )
+
     def __init__(self, direccion,codigo_postal, municipio, provincia,codigo_centro,tipo_centro,nombre_centro,publico_privado,bil,compensatoria):
         """
         Constructor de la clase CentroEducativo.
@@ -19,9 +31,15 @@ class CentroEducativo:
             publico_privado (str): Indica si es un centro público o privado
 
         Attributes:
-            distancia_km (float): Distancia en kilómetros hasta el centro (inicialmente None)
-            distancia_m (float): Distancia en metros hasta el centro (inicialmente None) 
-            duracion (float): Tiempo estimado de llegada en minutos (inicialmente None)
+            distancia_km (str): Distancia en formato legible, solo para mostrar (inicialmente None)
+            distancia_m (int): Distancia en metros hasta el centro (inicialmente None) 
+            duracion (str): Tiempo estimado de llegada en formato legible, solo para mostrar (inicialmente None)
+            duracion_s (int): Tiempo estimado de llegada en segundos, usado para ordenar (inicialmente None)
+            error_distancia (str): Motivo por el que no se pudo calcular la distancia (inicialmente None)
+            latitud (float): Latitud del centro, una vez geocodificado (inicialmente None)
+            longitud (float): Longitud del centro, una vez geocodificado (inicialmente None)
+            distancia_estimada_km (float): Distancia por carretera estimada sin Google Maps (inicialmente None)
+            duracion_estimada_min (float): Duración estimada sin Google Maps, en minutos (inicialmente None)
         """
         self.direccion = direccion
         self.codigo_postal = codigo_postal
@@ -36,6 +54,12 @@ class CentroEducativo:
         self.distancia_km = None
         self.distancia_m = None
         self.duracion = None
+        self.duracion_s = None
+        self.error_distancia = None
+        self.latitud = None
+        self.longitud = None
+        self.distancia_estimada_km = None
+        self.duracion_estimada_min = None
 
     def __repr__(self):
         """
@@ -48,6 +72,43 @@ class CentroEducativo:
         return f"CentroEducativo({self.nombre_centro}, {self.codigo_centro})"
     
     
+    def direccion_destino(self):
+        """
+        Construye la dirección completa del centro tal y como se envía a Google Maps.
+
+        Returns:
+            str: Dirección con el formato 'direccion,codigo_postal, municipio, provincia'
+        """
+        return f"{self.direccion},{self.codigo_postal}, {self.municipio}, {self.provincia}"
+
+
+    def clave_destino(self):
+        """
+        Clave con la que se agrupan los centros que comparten ruta: sus coordenadas si ya
+        está geocodificado y, si no, su dirección de destino canónica.
+
+        Returns:
+            str: Clave del destino (ver services.normalizacionDirecciones.clave_destino)
+        """
+        return clave_destino(self.direccion_destino(), self.latitud, self.longitud)
+
+
+    def asignar_distancia(self, resultado):
+        """
+        Actualiza los atributos de distancia del centro a partir de un resultado
+        devuelto por `calcular_distancias` o `calcular_distancias_lote`.
+
+        Args:
+            resultado (dict): Diccionario con las claves 'distancia en Km',
+                              'distancia en m', 'duracion' y 'duracion en s'
+        """
+        self.distancia_km = resultado['distancia en Km']
+        self.distancia_m = resultado['distancia en m']
+        self.duracion = resultado['duracion']
+        self.duracion_s = resultado['duracion en s']
+        self.error_distancia = None
+
+
     def calcula_distancia_clase(self, direccion_origen):
         """
         Calcula la distancia entre una dirección de origen y el centro educativo.
@@ -58,32 +119,143 @@ class CentroEducativo:
         Returns:
             bool: True si el cálculo se realizó con éxito, False si hubo error
         Attributes modified:
-            distancia_km (float): Distancia en kilómetros hasta el centro
+            distancia_km (str): Distancia en formato legible hasta el centro
             distancia_m (int): Distancia en metros hasta el centro  
-            duracion (str): Tiempo estimado del trayecto
+            duracion (str): Tiempo estimado del trayecto en formato legible
+            duracion_s (int): Tiempo estimado del trayecto en segundos
         Example:
             >>> centro.calcula_distancia_clase("Calle Example 123, Ciudad")
             True
         """
         # Construir la dirección completa de destino
-        direccion_destino = f"{self.direccion},{self.codigo_postal}, {self.municipio}, {self.provincia}"
+        direccion_destino = self.direccion_destino()
         
         # Calcular las distancias usando el servicio de Google
         resultado = calcular_distancias(direccion_origen, direccion_destino)
         
         # Si se obtiene un resultado válido, actualizar los atributos del centro
         if resultado:
-            self.distancia_km = resultado['distancia en Km']
-            self.distancia_m = resultado['distancia en m']
-            self.duracion = resultado['duracion']
+            self.asignar_distancia(resultado)
             return True
         else:
-            # Si no se pudo calcular, mostrar mensaje de error y retornar False
-            print(f"No se pudo calcular la distancia para el destino: {direccion_destino}")
+            # Si no se pudo calcular, registrar el aviso y retornar False
+            self.error_distancia = "SIN_RESULTADO"
+            logger.warning("No se pudo calcular la distancia para el destino: %s", direccion_destino)
             return False
         
 
 
+    @staticmethod
+    def calcula_distancias_lote(centros, direccion_origen):
+        """
+        Calcula la distancia desde una dirección de origen hasta una lista de centros
+        agrupando las consultas en peticiones por lotes a Google Maps. Los centros con la
+        misma `clave_destino` (mismo edificio o misma dirección escrita de otra forma)
+        comparten una única consulta.
+
+        Cada centro con resultado válido queda actualizado igual que con
+        `calcula_distancia_clase`; los centros que no se pudieron calcular mantienen
+        sus atributos de distancia a None y el motivo en `error_distancia`.
+
+        Args:
+            centros (list): Lista de objetos CentroEducativo
+            direccion_origen (str): La dirección de origen para calcular las distancias
+
+        Returns:
+            dict: Código de centro -> motivo del fallo, para los centros sin resultado
+
+        Example:
+            >>> fallidos = CentroEducativo.calcula_distancias_lote(centros, "Calle Example 123, Ciudad")
+            >>> fallidos
+            {'18700232': 'NOT_FOUND'}
+        """
+        direcciones_destino = [centro.direccion_destino() for centro in centros]
+        claves = [centro.clave_destino() for centro in centros]
+        resultados, fallidos = calcular_distancias_lote(direccion_origen, direcciones_destino, claves)
+        return CentroEducativo._asignar_resultados(centros, resultados, fallidos)
+
+
+    @staticmethod
+    def calcula_distancias_incremental(centros, direccion_origen):
+        """
+        Igual que `calcula_distancias_lote`, pero devuelve cada centro en cuanto se
+        resuelve su ruta en lugar de esperar a que terminen todos.
+
+        Los centros llegan en el orden en que se resuelven (primero los que ya están en
+        la caché de rutas), no ordenados por duración. Los centros sin resultado se
+        devuelven igualmente, con el motivo en `error_distancia`.
+
+        Args:
+            centros (list): Lista de objetos CentroEducativo
+            direccion_origen (str): La dirección de origen para calcular las distancias
+
+        Yields:
+            CentroEducativo: Cada centro, ya actualizado con su distancia o su motivo de fallo
+
+        Example:
+            >>> for centro in CentroEducativo.calcula_distancias_incremental(centros, "Calle Example 123, Ciudad"):
+            ...     print(centro.codigo_centro, centro.duracion)
+        """
+        direcciones_destino = [centro.direccion_destino() for centro in centros]
+        claves = [centro.clave_destino() for centro in centros]
+        for indice, resultado, motivo in iterar_distancias_lote(direccion_origen, direcciones_destino, claves):
+            centro = centros[indice]
+            if motivo is None:
+                centro.asignar_distancia(resultado)
+            else:
+                centro.error_distancia = motivo
+            yield centro
+
+
+    @staticmethod
+    def calcula_distancias_concurrente(centros, direccion_origen, max_workers=None):
+        """
+        Calcula la distancia desde una dirección de origen hasta una lista de centros
+        con una consulta por centro repartida en un pool de hilos acotado.
+
+        Los centros se actualizan igual que con `calcula_distancias_lote`; el motivo de
+        cada fallo queda guardado en el atributo `error_distancia` del centro.
+
+        Args:
+            centros (list): Lista de objetos CentroEducativo
+            direccion_origen (str): La dirección de origen para calcular las distancias
+            max_workers (int): Número máximo de consultas simultáneas (por defecto GOOGLE_MAPS_MAX_WORKERS)
+
+        Returns:
+            dict: Código de centro -> motivo del fallo, para los centros sin resultado
+        """
+        direcciones_destino = [centro.direccion_destino() for centro in centros]
+        claves = [centro.clave_destino() for centro in centros]
+        resultados, fallidos = calcular_distancias_concurrente(direccion_origen, direcciones_destino, max_workers, claves)
+        return CentroEducativo._asignar_resultados(centros, resultados, fallidos)
+
+
+    @staticmethod
+    def _asignar_resultados(centros, resultados, fallidos):
+        # Asignar a cada centro su resultado o su motivo de fallo, en el mismo orden que la entrada
+        for centro, resultado in zip(centros, resultados):
+            if resultado:
+                centro.asignar_distancia(resultado)
+        for indice, motivo in fallidos.items():
+            centros[indice].error_distancia = motivo
+
+        return {centros[indice].codigo_centro: motivo for indice, motivo in fallidos.items()}
+
+
+    @staticmethod
+    def clave_duracion(centro):
+        """
+        Clave de ordenación por la duración numérica del trayecto.
+
+        Args:
+            centro (CentroEducativo): Centro con o sin distancia calculada
+
+        Returns:
+            float: Segundos del trayecto, o infinito si no se ha calculado
+        """
+        return centro.duracion_s if centro.duracion_s is not None else float('inf')
+
+
     @staticmethod
     def convertir_duracion_a_minutos(duracion_str):
         """
@@ -0,0 +1,293 @@
+import numpy as np
+import pandas as pd
+
+from models.CentroEducativo import CentroEducativo
+from services.googleConnect import calcular_matriz_distancias
+from services.normalizacionDirecciones import clave_destino
+
+
+# Correspondencia entre los atributos de CentroEducativo y las columnas de las consultas a la Junta
+COLUMNAS_ORIGEN = {
+    "direccion": "D_DOMICILIO",
+    "codigo_postal": "C_POSTAL",
+    "municipio": "D_MUNICIPIO",
+    "provincia": "D_PROVINCIA",
+    "tipo_centro": "D_DENOMINA",
+    "nombre_centro": "D_ESPECIFICA",
+    "codigo_centro": "codigo",
+    "publico_privado": "D_TIPO",
+    "bil": "ESO",
+}
+
+# Atributos que se rellenan al calcular distancias (inicialmente None)
+COLUMNAS_RESULTADO = (
+    "distancia_km", "duracion", "error_distancia",
+    "latitud", "longitud", "distancia_estimada_km", "duracion_estimada_min",
+)
+
+# Atributos numéricos del trayecto, guardados como float con NaN mientras no se calculan
+COLUMNAS_NUMERICAS = ("distancia_m", "duracion_s")
+
+# Columnas del CSV exportado y atributo del que sale cada una
+COLUMNAS_EXPORTAR = {
+    "Código Centro": "codigo_centro",
+    "Tipo Centro": "tipo_centro",
+    "Nombre Centro": "nombre_centro",
+    "Público/Privado": "publico_privado",
+    "Dirección": "direccion",
+    "Código Postal": "codigo_postal",
+    "Municipio": "municipio",
+    "Provincia": "provincia",
+    "Distancia (Km)": "distancia_km",
+    "Duración": "duracion",
+    "Distancia (m)": "distancia_m",
+    "Duración (s)": "duracion_s",
+    "Distancia estimada (Km)": "distancia_estimada_km",
+    "Duración estimada (min)": "duracion_estimada_min",
+    "Idiomas": "bil",
+}
+
+
+class _Columna:
+    # Descriptor que lee y escribe el valor de la fila de la vista en la columna de la colección
+    def __set_name__(self, propietario, nombre):
+        self.nombre = nombre
+
+    def __get__(self, vista, tipo=None):
+        if vista is None:
+            return self
+        return vista._coleccion.columnas[self.nombre][vista._indice]
+
+    def __set__(self, vista, valor):
+        vista._coleccion.columnas[self.nombre][vista._indice] = valor
+
+
+class _ColumnaNumerica(_Columna):
+    # Igual que _Columna, pero sobre un array float en el que NaN representa "sin calcular" (None)
+    def __get__(self, vista, tipo=None):
+        if vista is None:
+            return self
+        valor = vista._coleccion.columnas[self.nombre][vista._indice]
+        return None if np.isnan(valor) else valor
+
+    def __set__(self, vista, valor):
+        vista._coleccion.columnas[self.nombre][vista._indice] = np.nan if valor is None else valor
+
+
+class VistaCentro:
+    """
+    Vista ligera de una fila de ColeccionCentros.
+
+    Expone los mismos atributos y métodos que CentroEducativo, así que se puede pasar a
+    cualquier función que trabaje con centros (cálculo de distancias, estimador offline,
+    índice espacial...). Los valores no se copian: se leen y escriben directamente en las
+    columnas de la colección.
+    """
+
+    __slots__ = ("_coleccion", "_indice")
+
+    def __init__(self, coleccion, indice):
+        self._coleccion = coleccion
+        self._indice = indice
+
+    @property
+    def indice(self):
+        """Posición del centro dentro de su colección."""
+        return self._indice
+
+    # Mismos atributos que el modelo CentroEducativo, leídos de las columnas de la colección
+    direccion = _Columna()
+    codigo_postal = _Columna()
+    municipio = _Columna()
+    provincia = _Columna()
+    codigo_centro = _Columna()
+    nombre_centro = _Columna()
+    tipo_centro = _Columna()
+    publico_privado = _Columna()
+    bil = _Columna()
+    compensatoria = _Columna()
+    distancia_km = _Columna()
+    distancia_m = _ColumnaNumerica()
+    duracion = _Columna()
+    duracion_s = _ColumnaNumerica()
+    error_distancia = _Columna()
+    latitud = _Columna()
+    longitud = _Columna()
+    distancia_estimada_km = _Columna()
+    duracion_estimada_min = _Columna()
+
+    # Mismos métodos que el modelo CentroEducativo
+    direccion_destino = CentroEducativo.direccion_destino
+    clave_destino = CentroEducativo.clave_destino
+    asignar_distancia = CentroEducativo.asignar_distancia
+    calcula_distancia_clase = CentroEducativo.calcula_distancia_clase
+    __repr__ = CentroEducativo.__repr__
+
+
+class ColeccionCentros:
+    """
+    Colección de centros educativos almacenada por columnas.
+
+    Cada atributo de CentroEducativo se guarda como un array de NumPy con un valor por
+    centro, de modo que construir, ordenar y exportar miles de centros no necesita crear
+    un objeto, diccionario o Series por fila. Los centros individuales se obtienen como
+    vistas ligeras (VistaCentro) sobre esas columnas.
+
+    Args:
+        columnas (dict): Nombre de atributo -> array con un valor por centro
+    """
+
+    def __init__(self, columnas):
+        self.columnas = columnas
+
+    @classmethod
+    def desde_dataframe(cls, df, compensatoria="No"):
+        """
+        Construye la colección a partir del DataFrame devuelto por las consultas a la Junta.
+
+        Args:
+            df (pd.DataFrame): Resultado de consulta_todos_centros o similares
+            compensatoria (str): Valor del atributo compensatoria para todos los centros
+
+        Returns:
+            ColeccionCentros: Colección con un centro por fila del DataFrame
+        """
+        n = len(df)
+        # Valores vacíos como None, igual que en un CentroEducativo sin ese dato
+        origen = df[list(COLUMNAS_ORIGEN.values())].astype(object)
+        origen = origen.where(origen.notna(), None)
+        columnas = {atributo: origen[columna].to_numpy(dtype=object) for atributo, columna in COLUMNAS_ORIGEN.items()}
+        columnas["compensatoria"] = np.full(n, compensatoria, dtype=object)
+        for atributo in COLUMNAS_RESULTADO:
+            columnas[atributo] = np.full(n, None, dtype=object)
+        for atributo in COLUMNAS_NUMERICAS:
+            columnas[atributo] = np.full(n, np.nan, dtype=float)
+        return cls(columnas)
+
+    def __len__(self):
+        return len(self.columnas["codigo_centro"])
+
+    def __getitem__(self, indice):
+        return VistaCentro(self, indice)
+
+    def __iter__(self):
+        for indice in range(len(self)):
+            yield VistaCentro(self, indice)
+
+    def vistas(self):
+        """Devuelve una lista con una vista por centro, para las funciones que trabajan con listas de centros."""
+        return list(self)
+
+    def tomar(self, indices):
+        """
+        Devuelve una nueva colección con los centros de las posiciones indicadas, en ese orden.
+
+        Args:
+            indices (array-like): Posiciones de los centros (o máscara booleana)
+
+        Returns:
+            ColeccionCentros: Colección con copias de las filas seleccionadas
+        """
+        indices = np.asarray(indices)
+        if indices.dtype != bool:
+            indices = indices.astype(np.intp)
+        return ColeccionCentros({nombre: valores[indices] for nombre, valores in self.columnas.items()})
+
+    def ordenar_por_duracion(self, solo_calculados=True):
+        """
+        Devuelve los centros ordenados por la duración del trayecto.
+
+        Args:
+            solo_calculados (bool): Descartar los centros sin duración calculada
+
+        Returns:
+            ColeccionCentros: Nueva colección ordenada de menor a mayor duración
+        """
+        # Ordenación directa sobre los segundos; los NaN (sin calcular) quedan al final
+        segundos = self.columnas["duracion_s"]
+        orden = np.argsort(segundos, kind="stable")
+        if solo_calculados:
+            orden = orden[~np.isnan(segundos[orden])]
+        return self.tomar(orden)
+
+    def direcciones_destino(self):
+        """Devuelve la dirección de destino de cada centro, con el formato de CentroEducativo.direccion_destino."""
+        return [f"{direccion},{codigo_postal}, {municipio}, {provincia}" for direccion, codigo_postal, municipio, provincia
+                in zip(self.columnas["direccion"], self.columnas["codigo_postal"], self.columnas["municipio"], self.columnas["provincia"])]
+
+    def claves_destino(self):
+        """Devuelve la clave de agrupación de cada centro, con el formato de CentroEducativo.clave_destino."""
+        return [clave_destino(direccion, latitud, longitud) for direccion, latitud, longitud
+                in zip(self.direcciones_destino(), self.columnas["latitud"], self.columnas["longitud"])]
+
+    def calcula_matriz_duraciones(self, direcciones_origen):
+        """
+        Calcula en una sola pasada la duración desde varios orígenes hasta todos los centros,
+        usando filas de varios orígenes en cada petición a Distance Matrix.
+
+        Args:
+            direcciones_origen (list): Direcciones de origen a comparar
+
+        Returns:
+            tuple: (segundos, fallidos)
+                - segundos (np.ndarray): Matriz orígenes x centros con la duración en segundos (NaN si falló)
+                - fallidos (dict): (índice del origen, código de centro) -> motivo del fallo
+        """
+        resultados, fallidos = calcular_matriz_distancias(list(direcciones_origen), self.direcciones_destino(), self.claves_destino())
+        segundos = np.array([[resultado.get("duracion en s", np.nan) for resultado in fila] for fila in resultados], dtype=float)
+        codigos = self.columnas["codigo_centro"]
+        return segundos, {(i, codigos[indice]): motivo for (i, indice), motivo in fallidos.items()}
+
+    def a_dataframe_multiorigen(self, direcciones_origen, segundos):
+        """
+        Construye la tabla comparativa de varios orígenes: una fila por centro con los
+        minutos desde cada origen, el mínimo, la media, el origen más cercano y cuántos
+        orígenes tienen ruta.
+
+        La media solo se da si hay ruta desde todos los orígenes (con alguna ruta fallida
+        sería la media de otros orígenes y no se podría comparar). Los centros se ordenan
+        por la media de minutos; los incompletos quedan después, ordenados por el mínimo,
+        y los que no tienen duración desde ningún origen, al final.
+
+        Args:
+            direcciones_origen (list): Direcciones de origen, en el orden de las filas de `segundos`
+            segundos (np.ndarray): Matriz orígenes x centros devuelta por `calcula_matriz_duraciones`
+
+        Returns:
+            pd.DataFrame: Tabla ancha con una columna de minutos por origen
+        """
+        minutos = np.round(np.asarray(segundos, dtype=float) / 60, 1)
+        df = pd.DataFrame({nombre: self.columnas[atributo] for nombre, atributo in COLUMNAS_EXPORTAR.items()
+                           if atributo in COLUMNAS_ORIGEN})
+        for origen, fila in zip(direcciones_origen, minutos):
+            df[f"Minutos desde {origen}"] = fila
+
+        # Mínimo y mejor origen ignorando los pares sin calcular; media solo con todos calculados
+        calculados = ~np.isnan(minutos)
+        alguno = calculados.any(axis=0)
+        df["Mínimo (min)"] = np.where(alguno, np.nanmin(np.where(calculados, minutos, np.inf), axis=0), np.nan)
+        df["Media (min)"] = np.where(calculados.all(axis=0), np.round(minutos.mean(axis=0), 1), np.nan)
+        mejor = np.argmin(np.where(calculados, minutos, np.inf), axis=0)
+        df["Origen más cercano"] = np.where(alguno, np.asarray(direcciones_origen, dtype=object)[mejor], None)
+        df["Orígenes con ruta"] = calculados.sum(axis=0)
+
+        return df.sort_values(["Media (min)", "Mínimo (min)"], kind="stable", na_position="last").reset_index(drop=True)
+
+    def a_dataframe(self, columnas=COLUMNAS_EXPORTAR):
+        """
+        Construye el DataFrame de exportación directamente a partir de las columnas.
+
+        Args:
+            columnas (dict): Nombre de columna en el DataFrame -> atributo del centro
+
+        Returns:
+            pd.DataFrame: Un centro por fila
+        """
+        df = pd.DataFrame({nombre: self.columnas[atributo] for nombre, atributo in columnas.items()})
+        # Columnas numéricas enteras que admiten valores vacíos para los centros sin calcular
+        for nombre in ("Distancia (m)", "Duración (s)"):
+            if nombre in df.columns:
+                df[nombre] = df[nombre].round().astype("Int64")
+        if "Duración (s)" in df.columns:
+            df.insert(df.columns.get_loc("Duración (s)") + 1, "Duración (min)", (df["Duración (s)"] / 60).round(1))
+        return df
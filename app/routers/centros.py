@@ -0,0 +1,152 @@
+# Endpoints relacionados con los centros educativos.
+# Las consultas de filtrado se responden desde el almacén en memoria y la ordenación por
+# distancia se ejecuta en un hilo aparte, usando la caché de rutas y el limitador de tasa
+# compartidos de services.googleConnect. Los servicios (y con ellos pandas y NumPy) se
+# importan dentro de las funciones, así que crear la aplicación no los carga.
+
+import asyncio
+import json
+from typing import Literal, Optional
+
+from fastapi import APIRouter
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+
+from services.ConexionJuntaPandas import DENOMINACION_IES
+
+router = APIRouter(prefix="/api/centros", tags=["centros"])
+
+
+class PeticionOrdenarStream(BaseModel):
+    """Cuerpo de POST /api/centros/ordenar/stream."""
+    direccion_origen: str
+    provincia: Optional[str] = None
+    tipo: Optional[str] = DENOMINACION_IES
+    bilingue: bool = False
+    radio_km: Optional[float] = None  # Si se indica, solo se consultan los centros a menos de esta distancia en línea recta
+
+
+class PeticionOrdenar(PeticionOrdenarStream):
+    """Cuerpo de POST /api/centros/ordenar."""
+    k: Optional[int] = None  # Si se indica, solo se devuelven los k centros más cercanos
+    aproximado: bool = False  # Usar la tabla precalculada del código postal del origen si lo tiene
+
+
+# Representación JSON de un centro con su distancia calculada
+def _centro_ordenado(centro):
+    return {
+        "codigo": centro.codigo_centro,
+        "nombre": centro.nombre_centro,
+        "tipo": centro.tipo_centro,
+        "titularidad": centro.publico_privado,
+        "direccion": centro.direccion,
+        "codigo_postal": centro.codigo_postal,
+        "localidad": centro.municipio,
+        "provincia": centro.provincia,
+        "idiomas": centro.bil,
+        "distancia": centro.distancia_km,
+        "distancia_m": int(centro.distancia_m) if centro.distancia_m is not None else None,
+        "duracion": centro.duracion,
+        "duracion_s": int(centro.duracion_s) if centro.duracion_s is not None else None,
+        "duracion_estimada_min": centro.duracion_estimada_min,
+        "distancia_estimada_km": centro.distancia_estimada_km,
+    }
+
+
+# Centros que cumplen los filtros de la petición (bloqueante con `radio_km`: geocodifica el
+# origen si no está en la caché; sin coordenadas del origen no se descarta ningún centro)
+def _coleccion(peticion):
+    from models.ColeccionCentros import ColeccionCentros
+    from services.almacenCentros import obtener_almacen
+    from services.googleConnect import obtener_coordenadas
+
+    almacen = obtener_almacen()
+    origen = obtener_coordenadas(peticion.direccion_origen) if peticion.radio_km else None
+    posiciones = almacen.posiciones(provincia=peticion.provincia, tipo=peticion.tipo, bilingue=peticion.bilingue,
+                                    origen=origen, radio_km=peticion.radio_km)
+    return ColeccionCentros.desde_dataframe(almacen.subconjunto(posiciones))
+
+
+# Ordenación bloqueante (consultas a Google Maps), pensada para ejecutarse en un hilo aparte
+def _ordenar(peticion):
+    from models.CentroEducativo import CentroEducativo
+    from services.estimadorOffline import ordenar_top_k
+    from services.tablaCodigosPostales import ordenar_por_tabla
+
+    coleccion = _coleccion(peticion)
+    centros = coleccion.vistas()
+    # Con la tabla precalculada la ordenación es una búsqueda, sin consultas a Google Maps
+    ordenados = ordenar_por_tabla(peticion.direccion_origen, centros) if peticion.aproximado else None
+    if ordenados is not None:
+        ordenada = coleccion.tomar([centro.indice for centro in ordenados[:peticion.k or None]])
+    elif peticion.k:
+        ordenados, _ = ordenar_top_k(peticion.direccion_origen, centros, peticion.k)
+        ordenada = coleccion.tomar([centro.indice for centro in ordenados])
+    else:
+        CentroEducativo.calcula_distancias_lote(centros, peticion.direccion_origen)
+        ordenada = coleccion.ordenar_por_duracion(solo_calculados=True)
+
+    return _resumen(peticion, centros, ordenada)
+
+
+# Respuesta final de una ordenación: centros ordenados por duración y centros sin ruta
+def _resumen(peticion, centros, ordenada):
+    fallidos = [{"codigo": centro.codigo_centro, "motivo": centro.error_distancia}
+                for centro in centros if centro.error_distancia is not None]
+    return {
+        "origen": peticion.direccion_origen,
+        "total": len(ordenada),
+        "centros": [_centro_ordenado(centro) for centro in ordenada],
+        "fallidos": fallidos,
+    }
+
+
+# Formatear un evento del flujo como línea NDJSON o como mensaje SSE
+def _evento(formato, evento, datos):
+    texto = json.dumps(datos, ensure_ascii=False)
+    if formato == "sse":
+        return f"event: {evento}\ndata: {texto}\n\n"
+    return json.dumps({"evento": evento, **datos}, ensure_ascii=False) + "\n"
+
+
+# Generador bloqueante con los eventos de la ordenación; StreamingResponse lo recorre en un hilo aparte
+def _ordenar_incremental(peticion, formato):
+    from models.CentroEducativo import CentroEducativo
+
+    coleccion = _coleccion(peticion)
+    centros = coleccion.vistas()
+    yield _evento(formato, "inicio", {"origen": peticion.direccion_origen, "total": len(centros)})
+    for centro in CentroEducativo.calcula_distancias_incremental(centros, peticion.direccion_origen):
+        if centro.error_distancia is None:
+            yield _evento(formato, "centro", _centro_ordenado(centro))
+        else:
+            yield _evento(formato, "fallido", {"codigo": centro.codigo_centro, "motivo": centro.error_distancia})
+
+    # Al terminar, la lista completa ya ordenada por duración
+    ordenada = coleccion.ordenar_por_duracion(solo_calculados=True)
+    yield _evento(formato, "resumen", _resumen(peticion, centros, ordenada))
+
+
+@router.get("")
+async def listar_centros(provincia: Optional[str] = None, tipo: Optional[str] = DENOMINACION_IES, bilingue: bool = False):
+    """Devuelve los centros filtrados por provincia, tipo de centro y programa bilingüe."""
+    from services.almacenCentros import obtener_almacen
+
+    centros = obtener_almacen().buscar(provincia=provincia, tipo=tipo, bilingue=bilingue)
+    return {"total": len(centros), "centros": centros}
+
+
+@router.post("/ordenar")
+async def ordenar_centros(peticion: PeticionOrdenar):
+    """Ordena los centros filtrados por la duración del trayecto desde `direccion_origen`."""
+    return await asyncio.to_thread(_ordenar, peticion)
+
+
+@router.post("/ordenar/stream")
+async def ordenar_centros_stream(peticion: PeticionOrdenarStream, formato: Literal["ndjson", "sse"] = "ndjson"):
+    """
+    Igual que /ordenar, pero envía cada centro en cuanto se resuelve su ruta (NDJSON o
+    Server-Sent Events) y termina con un evento 'resumen' con la lista ordenada por duración.
+    """
+    tipo_contenido = "text/event-stream" if formato == "sse" else "application/x-ndjson"
+    return StreamingResponse(_ordenar_incremental(peticion, formato), media_type=tipo_contenido)
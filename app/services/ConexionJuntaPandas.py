@@ -1,35 +1,246 @@
-import requests
-import pandas as pd
-from dotenv import load_dotenv
-import os
+import json
+import logging
+from services.configuracion import obtener_config
+from services.snapshotJunta import obtener_snapshot
+from services.metricas import contar, cronometro
 
-# Cargar las variables de entorno desde el archivo .env
-load_dotenv()
+logger = logging.getLogger(__name__)
 
-# Datos de la API
-API_URL = 'https://www.juntadeandalucia.es/datosabiertos/portal/api/3/action/datastore_search'
-resource_id = os.getenv("resource_id")
+# La API se configura con JUNTA_API_BASE (permite apuntar a otro servidor CKAN, por ejemplo el de
+# los benchmarks) y resource_id. La copia local está activada por defecto (JUNTA_SNAPSHOT), se
+# comprueba contra el portal como mucho cada JUNTA_SNAPSHOT_INTERVALO_MIN minutos y con
+# JUNTA_OFFLINE=1 no se consulta la red. Ver services/configuracion.py.
+# pandas y NumPy se importan dentro de las funciones que los usan, para que importar las
+# constantes de este módulo (por ejemplo, desde el router de la API) no los cargue.
+
+
+def _url_api(accion):
+    return f"{obtener_config().junta_api_base}/{accion}"
+
+
+# Denominación de los institutos de educación secundaria (columna D_DENOMINA)
+DENOMINACION_IES = "Instituto de Educación Secundaria"
+
+# Programas bilingües/plurilingües con inglés que se consideran en los filtros bilingües (columna ESO)
+PROGRAMAS_BILINGUES = ["PLURIL FRA/ING","BIL ING","PLURIL ING/FRA","BIL ING + PLURIL ING/FRA","BIL ING + PLURIL ING/ALE","PLURIL ING/FRA + PLURIL FRA/ING","BIL ING + BIL FRA"]
+
+# Columnas que devuelven las consultas y columnas que se guardan como categóricas
+COLUMNAS_CONSULTA = ["D_DOMICILIO","C_POSTAL","D_MUNICIPIO","D_PROVINCIA","D_DENOMINA","D_ESPECIFICA","codigo","D_TIPO","ESO"]
+COLUMNAS_CATEGORICAS = ["D_DENOMINA","D_PROVINCIA","D_TIPO","ESO"]
 
 
 
 """##-- EXTRACIÓN DE DATOS DE LA API --##"""
-# Obtener datos de los centros desde la API de la Junta de Andalucía
-def obtener_centros(limit=2000):
+# Recorrer página a página los centros de la API de la Junta de Andalucía
+def iterar_centros(filtros=None, q=None, tam_pagina=None, max_registros=None, lanzar_errores=False):
+    """
+    Generador que devuelve los registros de centros de `datastore_search` página a página.
+
+    Avanza con `offset` hasta alcanzar el `total` que informa la API, de modo que no se
+    trunca el listado aunque el conjunto de datos crezca, y nunca tiene en memoria más
+    de una página de la respuesta.
+
+    Args:
+        filtros (dict): Filtros exactos que se delegan en el servidor (parámetro `filters`),
+                        por ejemplo {"D_DENOMINA": "Instituto de Educación Secundaria"}
+        q (str): Búsqueda de texto libre que se delega en el servidor (parámetro `q`)
+        tam_pagina (int): Número de registros pedidos en cada petición (por defecto JUNTA_TAM_PAGINA)
+        max_registros (int): Número máximo de registros a devolver (None para todos)
+        lanzar_errores (bool): Si es True, un error HTTP lanza una excepción en lugar de
+                               terminar el recorrido en silencio
+
+    Yields:
+        dict: Un registro de centro tal y como lo devuelve la API
+
+    Example:
+        >>> for centro in iterar_centros(filtros={"D_PROVINCIA": "Granada"}):
+        ...     print(centro["D_ESPECIFICA"])
+    """
+    # Importación local: requests solo se carga cuando hay que consultar la API
+    import requests
+
+    config = obtener_config()
     params = {
-        'resource_id': '82f92e32-c5ee-4c60-8643-bfb19e130cef',  # ID del recurso
-        'limit': limit
+        'resource_id': config.resource_id,
+        'limit': tam_pagina or config.junta_tam_pagina
     }
-    
-    response = requests.get(API_URL, params=params)
-    if response.status_code == 200:
-        data = response.json()
-        return data['result']['records']
+    if filtros:
+        params['filters'] = json.dumps(filtros)
+    if q:
+        params['q'] = q
+
+    offset = 0
+    devueltos = 0
+    # Reutilizar la misma conexión para todas las páginas
+    with requests.Session() as sesion:
+        while True:
+            params['offset'] = offset
+            contar("junta.paginas")
+            with cronometro("junta.pagina"):
+                response = sesion.get(_url_api('datastore_search'), params=params)
+            if lanzar_errores:
+                response.raise_for_status()
+            if response.status_code != 200:
+                contar("junta.errores")
+                logger.error("Error al obtener los datos: %s", response.status_code)
+                return
+
+            resultado = response.json()['result']
+            registros = resultado['records']
+            for registro in registros:
+                yield registro
+                devueltos += 1
+                if max_registros is not None and devueltos >= max_registros:
+                    return
+
+            offset += len(registros)
+            total = resultado.get('total')
+            if not registros or (total is not None and offset >= total):
+                return
+
+
+"""##-- COPIA LOCAL --##"""
+# Consultar la fecha de última modificación del recurso en el portal
+def obtener_version_recurso():
+    import requests
+
+    try:
+        response = requests.get(_url_api('resource_show'), params={'id': obtener_config().resource_id}, timeout=30)
+        if response.status_code == 200:
+            resultado = response.json()['result']
+            return resultado.get('last_modified') or resultado.get('metadata_modified')
+    except Exception as e:
+        logger.warning("Error al consultar la versión del recurso: %s", e)
+    return None
+
+
+# Actualizar la copia local si el recurso ha cambiado en el portal
+def actualizar_snapshot(forzar=False):
+    """
+    Comprueba si el conjunto de datos ha cambiado en el portal y, en ese caso, sincroniza
+    la copia local.
+
+    La comprobación se hace como mucho una vez cada JUNTA_SNAPSHOT_INTERVALO_MIN minutos. Si la
+    fecha de última modificación del recurso coincide con la de la copia, no se descarga
+    nada; si ha cambiado (o el portal no la informa), se descarga el listado y solo se
+    reescriben los registros cuyo contenido es distinto.
+
+    Args:
+        forzar (bool): Descargar y sincronizar aunque la copia parezca vigente
+
+    Returns:
+        dict: Resultado de la sincronización, o {"omitido": motivo} si no hizo falta
+    """
+    snapshot = obtener_snapshot()
+    if not forzar and not snapshot.vacio():
+        if snapshot.segundos_desde_comprobacion() < obtener_config().junta_snapshot_intervalo_min * 60:
+            return {"omitido": "comprobado recientemente"}
+        version = obtener_version_recurso()
+        if version is not None and version == snapshot.version():
+            snapshot.marcar_comprobado()
+            return {"omitido": "sin cambios en el portal"}
     else:
-        print(f"Error al obtener los datos: {response.status_code}")
-        return []
+        version = obtener_version_recurso()
+
+    try:
+        return snapshot.sincronizar(iterar_centros(lanzar_errores=True), version)
+    except Exception as e:
+        # Si falla la descarga se mantiene la copia anterior
+        contar("junta.errores")
+        logger.error("Error al actualizar la copia local de centros: %s", e)
+        return {"omitido": str(e)}
+
+
+# Obtener datos de los centros desde la API de la Junta de Andalucía
+def obtener_centros(limit=None):
+    """Devuelve en una lista los registros de centros (todos, o como mucho `limit`)."""
+    return list(iterar_centros(max_registros=limit))
 
 
 """##-- FILTROS --##"""
+# Cargar registros de centros en un DataFrame con tipos categóricos
+def cargar_dataframe(registros):
+    """
+    Construye un DataFrame a partir de registros de centros.
+
+    Las columnas con pocos valores distintos (denominación, provincia, titularidad y
+    programa bilingüe) se guardan como categóricas, lo que reduce la memoria y hace que
+    las comparaciones de los filtros trabajen sobre códigos enteros. Se garantiza que
+    existen todas las columnas de COLUMNAS_CONSULTA aunque no haya registros.
+
+    Args:
+        registros (iterable): Lista o generador de diccionarios de centros
+
+    Returns:
+        pd.DataFrame: Un centro por fila
+    """
+    import pandas as pd
+
+    df = pd.DataFrame.from_records(list(registros))
+    for columna in COLUMNAS_CONSULTA:
+        if columna not in df.columns:
+            df[columna] = None
+    for columna in COLUMNAS_CATEGORICAS:
+        df[columna] = df[columna].astype("category")
+    return df
+
+
+class FiltroCentros:
+    """
+    Filtro vectorizado y componible sobre un DataFrame de centros.
+
+    Cada método añade un predicado y devuelve un filtro nuevo, de modo que se pueden
+    encadenar; los predicados se evalúan como máscaras booleanas sobre columnas
+    completas, sin recorrer los centros uno a uno.
+
+    Args:
+        df (pd.DataFrame): Centros cargados con `cargar_dataframe`
+        mascara (np.ndarray): Máscara inicial (por defecto, todos los centros)
+
+    Example:
+        >>> FiltroCentros(df).tipo().provincias("Granada").programas().resultado()
+    """
+
+    def __init__(self, df, mascara=None):
+        import numpy as np
+
+        self.df = df
+        self.mascara = np.ones(len(df), dtype=bool) if mascara is None else mascara
+
+    def filtrar(self, predicado):
+        """Añade un predicado arbitrario: una función que recibe el DataFrame y devuelve una máscara."""
+        import numpy as np
+
+        return FiltroCentros(self.df, self.mascara & np.asarray(predicado(self.df), dtype=bool))
+
+    def _en(self, columna, valores):
+        return self.filtrar(lambda df: df[columna].isin(valores))
+
+    def tipo(self, *denominaciones):
+        """Centros de alguno de los tipos indicados en D_DENOMINA (por defecto, IES)."""
+        return self._en("D_DENOMINA", denominaciones or [DENOMINACION_IES])
+
+    def provincias(self, *provincias):
+        """Centros de alguna de las provincias indicadas."""
+        return self._en("D_PROVINCIA", provincias)
+
+    def programas(self, programas=PROGRAMAS_BILINGUES):
+        """Centros con alguno de los programas lingüísticos indicados en la columna ESO (por defecto, bilingües)."""
+        return self._en("ESO", programas)
+
+    def titularidad(self, *publico_privado):
+        """Centros con la titularidad indicada en D_TIPO (ej: 'Público', 'Privado')."""
+        return self._en("D_TIPO", publico_privado)
+
+    def resultado(self, columnas=COLUMNAS_CONSULTA):
+        """Devuelve los centros que cumplen todos los predicados con las columnas indicadas."""
+        return self.df.loc[self.mascara, columnas].reset_index(drop=True)
+
+    def registros(self):
+        """Devuelve los centros que cumplen todos los predicados como lista de diccionarios."""
+        return self.df[self.mascara].to_dict("records")
+
+
 # Filtrar centros por provincia especificada
 def filtrar_centros_por_provincia(centros, provincia):
     """
@@ -37,7 +248,7 @@ def filtrar_centros_por_provincia(centros, provincia):
     Esta función toma una lista de centros educativos y filtra aquellos que son 
     Institutos de Educación Secundaria (IES) en la provincia especificada.
     Args:
-        centros (list): Lista de diccionarios con la información de los centros educativos.
+        centros (iterable): Lista (o generador) de diccionarios con la información de los centros educativos.
                         Cada diccionario debe contener las claves 'D_DENOMINA' y 'D_PROVINCIA'.
         provincia (str): Nombre de la provincia por la que filtrar los centros.
     Returns:
@@ -48,16 +259,7 @@ def filtrar_centros_por_provincia(centros, provincia):
         >>> filtrar_centros_por_provincia(centros, 'SEVILLA')
         [{'D_DENOMINA': 'Instituto de Educación Secundaria', 'D_PROVINCIA': 'SEVILLA'}, ...]
     """
-    centros_filtrados = []
-    for centro in centros:
-        denominacion_centro = centro.get("D_DENOMINA")
-        provincia_centro = centro.get("D_PROVINCIA")
-        
-        # Filtrar solo los centros que tienen coordenadas y coinciden con la provincia
-        if denominacion_centro == "Instituto de Educación Secundaria" and provincia_centro == provincia:
-            centros_filtrados.append(centro)
-    
-    return centros_filtrados
+    return FiltroCentros(cargar_dataframe(centros)).tipo().provincias(provincia).registros()
 
 # Filtrar TODOS  Bilingües
 def filtrar_todos_centros_bil(centros):
@@ -79,16 +281,7 @@ def filtrar_todos_centros_bil(centros):
         >>> filtrar_todos_centros_bil(centros)
         [{'D_DENOMINA': 'Instituto de Educación Secundaria', 'ESO': 'BIL ING'}, ...]
     """
-    centros_filtrados = []
-    for centro in centros:
-        denominacion_centro = centro.get("D_DENOMINA")
-        es_bilingue_ing = centro.get("ESO")
-        
-        # Filtrar solo los centros de educación secundaria y bilingües
-        if denominacion_centro == "Instituto de Educación Secundaria" and es_bilingue_ing in["PLURIL FRA/ING","BIL ING","PLURIL ING/FRA","BIL ING + PLURIL ING/FRA","BIL ING + PLURIL ING/ALE","PLURIL ING/FRA + PLURIL FRA/ING","BIL ING + BIL FRA"]:
-            centros_filtrados.append(centro)
-    
-    return centros_filtrados
+    return FiltroCentros(cargar_dataframe(centros)).tipo().programas().registros()
 
 
 # Filtrar TODOS IES
@@ -109,62 +302,69 @@ def filtrar_todos_centros(centros):
         >>> filtrar_todos_centros_bil(centers)
         [{"D_DENOMINA": "Instituto de Educación Secundaria", "ESO": True}]
     """
-
-    centros_filtrados = []
-    for centro in centros:
-        denominacion_centro = centro.get("D_DENOMINA")        
-        # Filtrar solo los centros de educación secundaria
-        if denominacion_centro == "Instituto de Educación Secundaria":
-            centros_filtrados.append(centro)
-    
-    return centros_filtrados
+    return FiltroCentros(cargar_dataframe(centros)).tipo().registros()
 
 
 
 # Filtrar centros por provincia especificada de educación secundaria y bilingües
 def filtrar_centros_por_provincia_bil(centros, provincia):
-    centros_filtrados = []
-    for centro in centros:
-        denominacion_centro = centro.get("D_DENOMINA")
-        provincia_centro = centro.get("D_PROVINCIA")
-        es_bilingue_ing = centro.get("ESO")
-        
-        # Filtrar solo los centros que tienen coordenadas y coinciden con la provincia
-        if denominacion_centro == "Instituto de Educación Secundaria" and es_bilingue_ing in["PLURIL FRA/ING","BIL ING","PLURIL ING/FRA","BIL ING + PLURIL ING/FRA","BIL ING + PLURIL ING/ALE","PLURIL ING/FRA + PLURIL FRA/ING","BIL ING + BIL FRA"]  and provincia_centro == provincia:
-            centros_filtrados.append(centro)
-    
-    return centros_filtrados
+    return FiltroCentros(cargar_dataframe(centros)).tipo().provincias(provincia).programas().registros()
 
 
 """##-- CONSULTAS --##"""
-def consulta_todos_centros_bil(limit = 3000 ):
-    centros = obtener_centros(limit)  # Puedes ajustar el límite
-    centros_filtrados = filtrar_todos_centros_bil(centros)
-    df = pd.DataFrame(centros_filtrados)
-    return (df[["D_DOMICILIO","C_POSTAL","D_MUNICIPIO","D_PROVINCIA","D_DENOMINA","D_ESPECIFICA","codigo","D_TIPO","ESO"]])
+# DataFrame con todos los centros, cargado una sola vez y reutilizado por todas las consultas
+_df_centros = None
+
+
+def obtener_dataframe_centros(offline=None):
+    """
+    Devuelve el DataFrame con todos los centros, cargándolo solo la primera vez.
+
+    Con la copia local activada, el DataFrame se vuelve a cargar únicamente cuando
+    `actualizar_snapshot` ha sincronizado cambios del portal; sin ella, se lee la API.
+
+    Args:
+        offline (bool): Leer solo la copia local sin consultar la red (por defecto JUNTA_OFFLINE)
+
+    Returns:
+        pd.DataFrame: Centros cargados con `cargar_dataframe`
+    """
+    global _df_centros
+    config = obtener_config()
+    offline = config.junta_offline if offline is None else offline
+    if offline or config.junta_snapshot:
+        cambios = {"omitido": "modo sin conexión"} if offline else actualizar_snapshot()
+        if _df_centros is None or "omitido" not in cambios:
+            _df_centros = cargar_dataframe(obtener_snapshot().registros())
+        return _df_centros
+    if _df_centros is None:
+        _df_centros = cargar_dataframe(iterar_centros())
+    return _df_centros
+
+
+# Todas las consultas filtran el mismo DataFrame con máscaras vectorizadas.
+# `limit` limita el número de registros considerados (None para el conjunto de datos completo).
+def _filtro_base(limit=None):
+    df = obtener_dataframe_centros()
+    return FiltroCentros(df.head(limit) if limit else df)
+
+
+def consulta_todos_centros_bil(limit = None ):
+    return _filtro_base(limit).tipo().programas().resultado()
 
 
 
-def consulta_todos_centros(limit = 3000 ):
-    centros = obtener_centros(limit)  # Puedes ajustar el límite
-    centros_filtrados = filtrar_todos_centros(centros)
-    df = pd.DataFrame(centros_filtrados)
-    return (df[["D_DOMICILIO","C_POSTAL","D_MUNICIPIO","D_PROVINCIA","D_DENOMINA","D_ESPECIFICA","codigo","D_TIPO","ESO"]])
+def consulta_todos_centros(limit = None ):
+    return _filtro_base(limit).tipo().resultado()
 
 
 
-def consulta_direccion(provincia_destino,limit = 1800 ):
-    centros = obtener_centros(limit)  # Puedes ajustar el límite
-    centros_filtrados = filtrar_centros_por_provincia(centros, provincia_destino)
-    df = pd.DataFrame(centros_filtrados)
-    return (df[["D_DOMICILIO"]])
+def consulta_direccion(provincia_destino,limit = None ):
+    return _filtro_base(limit).tipo().provincias(provincia_destino).resultado(["D_DOMICILIO"])
 
 
-def consulta_direccion_municipio_provincia(provincia_destino,limit = 1800 ):
-    centros = obtener_centros(limit)  # Puedes ajustar el límite
-    centros_filtrados = filtrar_centros_por_provincia_bil(centros, provincia_destino)
-    df = pd.DataFrame(centros_filtrados)
-    return (df[["D_DOMICILIO","C_POSTAL","D_MUNICIPIO","D_PROVINCIA","D_DENOMINA","D_ESPECIFICA","codigo","D_TIPO","ESO"]])
+def consulta_direccion_municipio_provincia(provincia_destino,limit = None ):
+    return _filtro_base(limit).tipo().provincias(provincia_destino).programas().resultado()
 
 
 
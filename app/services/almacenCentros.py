@@ -0,0 +1,137 @@
+# Conjunto de datos de centros cargado en memoria para el servidor de la API.
+# Se carga una sola vez al arrancar y mantiene índices por provincia y tipo de centro,
+# de modo que las consultas de filtrado no vuelven a consultar la API de la Junta, y un
+# índice espacial (creado en la primera consulta por radio) con las coordenadas en caché.
+
+import threading
+from collections import defaultdict
+
+import numpy as np
+
+from models.ColeccionCentros import ColeccionCentros
+from services.cacheRutas import obtener_cache
+from services.ConexionJuntaPandas import obtener_dataframe_centros, FiltroCentros, COLUMNAS_CONSULTA
+from services.indiceEspacial import IndiceEspacial
+from services.normalizacionDirecciones import normalizar_texto
+
+
+class AlmacenCentros:
+    """
+    Centros educativos en memoria con índices por provincia y tipo de centro.
+
+    Cada índice guarda, para cada valor normalizado (sin mayúsculas ni tildes), la
+    máscara que `FiltroCentros` calcula sobre el DataFrame categórico para ese valor; un
+    filtro es la conjunción de esas máscaras. La representación JSON de cada centro se
+    construye una sola vez al cargar.
+
+    Args:
+        df (pd.DataFrame): Centros cargados con `cargar_dataframe`
+    """
+
+    def __init__(self, df):
+        self.df = df[COLUMNAS_CONSULTA].reset_index(drop=True)
+        # Valores vacíos como None para que la respuesta sea JSON válido
+        valores = self.df.astype(object).where(self.df.notna(), None)
+        self.centros = [
+            {
+                "codigo": fila.codigo,
+                "nombre": fila.D_ESPECIFICA,
+                "tipo": fila.D_DENOMINA,
+                "titularidad": fila.D_TIPO,
+                "direccion": fila.D_DOMICILIO,
+                "codigo_postal": fila.C_POSTAL,
+                "localidad": fila.D_MUNICIPIO,
+                "provincia": fila.D_PROVINCIA,
+                "idiomas": fila.ESO,
+            }
+            for fila in valores.itertuples(index=False)
+        ]
+        filtro = FiltroCentros(self.df)
+        self._por_provincia = self._indexar("D_PROVINCIA", filtro.provincias)
+        self._por_tipo = self._indexar("D_DENOMINA", filtro.tipo)
+        self._bilingues = filtro.programas().mascara
+        self._indice_espacial = None
+        self._indice_espacial_lock = threading.Lock()
+
+    def _indexar(self, columna, predicado):
+        # Valores de la columna agrupados por su forma normalizada -> máscara de FiltroCentros
+        valores = defaultdict(list)
+        for valor in self.df[columna].dropna().unique():
+            valores[normalizar_texto(valor)].append(valor)
+        return {clave: predicado(*grupo).mascara for clave, grupo in valores.items()}
+
+    def __len__(self):
+        return len(self.centros)
+
+    def indice_espacial(self) -> IndiceEspacial:
+        """
+        Devuelve el índice espacial de los centros, creándolo la primera vez.
+
+        Usa las coordenadas ya guardadas en la caché de rutas (no geocodifica ningún
+        centro); los centros que no las tienen quedan en `sin_coordenadas`. Las coordenadas
+        que se guarden después se incorporan al recargar el almacén.
+        """
+        if self._indice_espacial is None:
+            with self._indice_espacial_lock:
+                if self._indice_espacial is None:
+                    cache = obtener_cache()
+                    coordenadas = [cache.obtener_coordenadas(direccion) or (np.nan, np.nan)
+                                   for direccion in ColeccionCentros.desde_dataframe(self.df).direcciones_destino()]
+                    latitudes, longitudes = np.array(coordenadas, dtype=float).reshape(-1, 2).T
+                    self._indice_espacial = IndiceEspacial(latitudes, longitudes)
+        return self._indice_espacial
+
+    def posiciones(self, provincia=None, tipo=None, bilingue=False, origen=None, radio_km=None):
+        """
+        Devuelve las posiciones de los centros que cumplen los filtros indicados.
+
+        Args:
+            provincia (str): Provincia (sin distinguir mayúsculas ni tildes)
+            tipo (str): Tipo de centro en D_DENOMINA (sin distinguir mayúsculas ni tildes)
+            bilingue (bool): Solo centros con programa bilingüe
+            origen (tuple): (latitud, longitud) desde la que se mide `radio_km`
+            radio_km (float): Solo centros a menos de esta distancia en línea recta de `origen`
+                              (los centros sin coordenadas en la caché se conservan)
+
+        Returns:
+            np.ndarray: Posiciones ordenadas de los centros
+        """
+        mascara = np.ones(len(self.centros), dtype=bool)
+        ninguno = np.zeros(len(self.centros), dtype=bool)
+        if provincia:
+            mascara &= self._por_provincia.get(normalizar_texto(provincia), ninguno)
+        if tipo:
+            mascara &= self._por_tipo.get(normalizar_texto(tipo), ninguno)
+        if bilingue:
+            mascara &= self._bilingues
+        if radio_km and origen is not None and origen[0] is not None:
+            indice = self.indice_espacial()
+            cercanos, _ = indice.en_radio(origen[0], origen[1], radio_km)
+            dentro = np.zeros(len(self.centros), dtype=bool)
+            dentro[cercanos] = True
+            dentro[indice.sin_coordenadas] = True
+            mascara &= dentro
+        return np.flatnonzero(mascara)
+
+    def buscar(self, provincia=None, tipo=None, bilingue=False):
+        """Devuelve la representación JSON de los centros que cumplen los filtros."""
+        return [self.centros[posicion] for posicion in self.posiciones(provincia, tipo, bilingue)]
+
+    def subconjunto(self, posiciones):
+        """Devuelve el DataFrame de los centros de las posiciones indicadas, con las columnas de las consultas."""
+        return self.df.iloc[posiciones].reset_index(drop=True)
+
+
+# Instancia compartida, cargada al arrancar el servidor
+_almacen = None
+_almacen_lock = threading.Lock()
+
+
+def obtener_almacen(recargar=False) -> AlmacenCentros:
+    """Devuelve el almacén de centros compartido, cargándolo la primera vez (o si se pide recargar)."""
+    global _almacen
+    if _almacen is None or recargar:
+        with _almacen_lock:
+            if _almacen is None or recargar:
+                _almacen = AlmacenCentros(obtener_dataframe_centros())
+    return _almacen
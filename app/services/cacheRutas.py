@@ -0,0 +1,213 @@
+# Caché persistente en disco (SQLite) para las consultas a Google Maps.
+# Guarda las rutas origen -> destino y las geocodificaciones para que las ejecuciones
+# repetidas solo consulten la red para los pares nuevos y no consuman cuota de la API.
+
+import json
+import sqlite3
+import threading
+import time
+from services.configuracion import obtener_config
+from services.metricas import contar
+from services.normalizacionDirecciones import normalizar_direccion
+
+# Versión del formato de los resultados de ruta guardados; al cambiarla, las entradas antiguas dejan de usarse
+VERSION_RUTAS = 2
+
+# Los aciertos no escriben en disco en cada lectura: la fecha de último acceso se acumula en
+# memoria y se vuelca cada ACCESOS_POR_VOLCADO aciertos o cada SEGUNDOS_ENTRE_VOLCADOS segundos
+ACCESOS_POR_VOLCADO = 500
+SEGUNDOS_ENTRE_VOLCADOS = 30
+
+
+# Normalizar una dirección para usarla como parte de la clave de la caché
+def normalizar_clave(texto: str) -> str:
+    """
+    Normaliza una dirección para que variantes de la misma compartan la misma clave.
+
+    Usa la forma canónica de `normalizar_direccion` (abreviaturas, "s/n", tildes y
+    espacios), de modo que "C/ Mayor, 1" y "Calle Mayor 1" aprovechan la misma entrada.
+
+    Args:
+        texto (str): Dirección tal y como se envía a Google Maps
+
+    Returns:
+        str: Dirección normalizada
+
+    Example:
+        >>> normalizar_clave("  C/ Mayor 1 ,18100,  Armilla ")
+        'calle mayor 1 18100 armilla'
+    """
+    return normalizar_direccion(texto)
+
+
+class CacheRutas:
+    """
+    Caché de rutas y coordenadas almacenada en una base de datos SQLite.
+
+    Las entradas caducan pasado el TTL y, cuando se supera el número máximo de
+    entradas, se eliminan las menos usadas recientemente. Lleva contadores de
+    aciertos y fallos para saber cuántas consultas a la API se han ahorrado.
+
+    Las lecturas no hacen commit: la fecha de último acceso de cada acierto se guarda
+    en memoria y se vuelca en bloque (`sincronizar`). Las escrituras de un bloque de
+    Distance Matrix se confirman juntas con `guardar_rutas`.
+
+    Args:
+        ruta (str): Ruta del fichero SQLite (':memory:' para una caché temporal; por defecto CACHE_GOOGLE_PATH)
+        ttl_dias (float): Días de validez de cada entrada (por defecto CACHE_GOOGLE_TTL_DIAS)
+        max_entradas (int): Número máximo de entradas antes de expulsar las más antiguas (por defecto CACHE_GOOGLE_MAX_ENTRADAS)
+    """
+
+    def __init__(self, ruta=None, ttl_dias=None, max_entradas=None):
+        config = obtener_config()
+        ruta = ruta or config.cache_google_path
+        self.ruta = ruta
+        self.ttl_segundos = (config.cache_google_ttl_dias if ttl_dias is None else ttl_dias) * 24 * 3600
+        self.max_entradas = config.cache_google_max_entradas if max_entradas is None else max_entradas
+        self.aciertos = 0
+        self.fallos = 0
+
+        # Una única conexión compartida, protegida por un cerrojo para poder usarla desde varios hilos
+        self._lock = threading.Lock()
+        self._conexion = sqlite3.connect(ruta, check_same_thread=False)
+        # WAL y synchronous=NORMAL: cada commit no fuerza una escritura síncrona del fichero completo
+        self._conexion.execute("PRAGMA journal_mode=WAL")
+        self._conexion.execute("PRAGMA synchronous=NORMAL")
+        self._conexion.execute(
+            "CREATE TABLE IF NOT EXISTS entradas ("
+            " clave TEXT PRIMARY KEY,"
+            " valor TEXT NOT NULL,"
+            " creado REAL NOT NULL,"
+            " accedido REAL NOT NULL)"
+        )
+        self._conexion.execute("CREATE INDEX IF NOT EXISTS idx_entradas_accedido ON entradas (accedido)")
+        self._conexion.commit()
+        self._num_entradas = self._conexion.execute("SELECT COUNT(*) FROM entradas").fetchone()[0]
+        self._accesos = {}  # Clave -> fecha del último acierto, pendiente de volcar
+        self._ultimo_volcado = time.monotonic()
+
+    @staticmethod
+    def _clave_ruta(origen, destino, modo):
+        return f"ruta{VERSION_RUTAS}|{modo}|{normalizar_clave(origen)}|{normalizar_clave(destino)}"
+
+    @staticmethod
+    def _clave_coordenadas(direccion):
+        return f"geo|{normalizar_clave(direccion)}"
+
+    def _obtener(self, clave):
+        ahora = time.time()
+        with self._lock:
+            fila = self._conexion.execute("SELECT valor, creado FROM entradas WHERE clave = ?", (clave,)).fetchone()
+            if fila is None or ahora - fila[1] > self.ttl_segundos:
+                self.fallos += 1
+                contar("cache.fallos")
+                return None
+            self._accesos[clave] = ahora
+            if len(self._accesos) >= ACCESOS_POR_VOLCADO or time.monotonic() - self._ultimo_volcado >= SEGUNDOS_ENTRE_VOLCADOS:
+                self._volcar_accesos()
+            self.aciertos += 1
+        contar("cache.aciertos")
+        return json.loads(fila[0])
+
+    def _guardar(self, claves_valores):
+        # Todas las entradas se escriben en una única transacción
+        ahora = time.time()
+        filas = [(clave, json.dumps(valor), ahora, ahora) for clave, valor in claves_valores]
+        if not filas:
+            return
+        with self._lock:
+            self._conexion.executemany(
+                "INSERT OR REPLACE INTO entradas (clave, valor, creado, accedido) VALUES (?, ?, ?, ?)", filas)
+            # El contador es aproximado (cuenta también los reemplazos); la expulsión lo recalcula
+            self._num_entradas += len(filas)
+            if self._num_entradas > self.max_entradas:
+                self._volcar_accesos()
+                self._expulsar()
+            self._conexion.commit()
+
+    def _volcar_accesos(self):
+        # Escribir las fechas de último acceso pendientes (con el cerrojo ya tomado)
+        if self._accesos:
+            self._conexion.executemany("UPDATE entradas SET accedido = ? WHERE clave = ?",
+                                       [(accedido, clave) for clave, accedido in self._accesos.items()])
+            self._conexion.commit()
+            self._accesos.clear()
+        self._ultimo_volcado = time.monotonic()
+
+    def sincronizar(self):
+        """Vuelca a disco las fechas de último acceso acumuladas en memoria."""
+        with self._lock:
+            self._volcar_accesos()
+
+    def cerrar(self):
+        """Vuelca los accesos pendientes y cierra la conexión con la base de datos."""
+        with self._lock:
+            self._volcar_accesos()
+            self._conexion.close()
+
+    def _expulsar(self):
+        # Eliminar primero las entradas caducadas y después las menos usadas, dejando un 10% de margen
+        limite = time.time() - self.ttl_segundos
+        self._conexion.execute("DELETE FROM entradas WHERE creado < ?", (limite,))
+        objetivo = int(self.max_entradas * 0.9)
+        self._conexion.execute(
+            "DELETE FROM entradas WHERE clave IN ("
+            " SELECT clave FROM entradas ORDER BY accedido ASC"
+            " LIMIT MAX(0, (SELECT COUNT(*) FROM entradas) - ?))",
+            (objetivo,),
+        )
+        self._num_entradas = self._conexion.execute("SELECT COUNT(*) FROM entradas").fetchone()[0]
+
+    def obtener_ruta(self, origen, destino, modo="driving"):
+        """Devuelve el resultado guardado para la ruta o None si no está en caché."""
+        return self._obtener(self._clave_ruta(origen, destino, modo))
+
+    def guardar_ruta(self, origen, destino, resultado, modo="driving"):
+        """Guarda el resultado de `calcular_distancias` para la ruta indicada."""
+        self._guardar([(self._clave_ruta(origen, destino, modo), resultado)])
+
+    def guardar_rutas(self, rutas, modo="driving"):
+        """Guarda en una sola transacción una lista de tuplas (origen, destino, resultado)."""
+        self._guardar([(self._clave_ruta(origen, destino, modo), resultado) for origen, destino, resultado in rutas])
+
+    def obtener_coordenadas(self, direccion):
+        """Devuelve la tupla (lat, lng) guardada para la dirección o None si no está en caché."""
+        valor = self._obtener(self._clave_coordenadas(direccion))
+        return tuple(valor) if valor is not None else None
+
+    def guardar_coordenadas(self, direccion, coordenadas):
+        """Guarda la tupla (lat, lng) obtenida para la dirección."""
+        self._guardar([(self._clave_coordenadas(direccion), list(coordenadas))])
+
+    def estadisticas(self):
+        """
+        Devuelve los contadores de uso de la caché.
+
+        Returns:
+            dict: Aciertos, fallos, porcentaje de aciertos y número de entradas guardadas
+        """
+        total = self.aciertos + self.fallos
+        with self._lock:
+            self._volcar_accesos()
+            entradas = self._conexion.execute("SELECT COUNT(*) FROM entradas").fetchone()[0]
+        return {
+            "aciertos": self.aciertos,
+            "fallos": self.fallos,
+            "porcentaje_aciertos": round(100 * self.aciertos / total, 1) if total else 0.0,
+            "entradas": entradas,
+        }
+
+
+# Instancia compartida, creada la primera vez que se necesita
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def obtener_cache() -> CacheRutas:
+    """Devuelve la caché compartida por todos los servicios, creándola si no existe."""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = CacheRutas()
+    return _cache
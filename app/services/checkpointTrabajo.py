@@ -0,0 +1,136 @@
+# Fichero de trabajo para reanudar un cálculo de distancias interrumpido.
+# Guarda el origen, los filtros y el resultado de cada centro ya calculado, de modo que si
+# el proceso se corta (cuota agotada, caída de la red...) se puede continuar sin volver a
+# consultar a Google Maps las rutas que ya se tenían.
+
+import json
+import logging
+import os
+import time
+from services.configuracion import obtener_config
+
+logger = logging.getLogger(__name__)
+
+
+class CheckpointTrabajo:
+    """
+    Estado de un cálculo de distancias desde un origen hasta un conjunto de centros.
+
+    Los resultados se acumulan en memoria y se vuelcan al fichero cada `cada` centros o
+    cada `segundos` segundos, lo que ocurra antes. El fichero se escribe en uno temporal
+    y se sustituye de golpe, así que un corte a mitad de escritura no lo deja corrupto.
+
+    Args:
+        ruta (str): Ruta del fichero de trabajo (JSON)
+        origen (str): Dirección de origen del cálculo
+        filtros (dict): Filtros con los que se obtuvo el listado de centros
+        cada (int): Número de centros registrados entre dos guardados (por defecto CHECKPOINT_TRABAJO_CADA)
+        segundos (float): Tiempo máximo entre dos guardados (por defecto CHECKPOINT_TRABAJO_SEGUNDOS)
+    """
+
+    def __init__(self, ruta, origen, filtros, cada=None, segundos=None):
+        config = obtener_config()
+        self.ruta = ruta
+        self.origen = origen
+        self.filtros = filtros
+        self.cada = config.checkpoint_trabajo_cada if cada is None else cada
+        self.segundos = config.checkpoint_trabajo_segundos if segundos is None else segundos
+        self.resultados = {}  # Código de centro -> resultado con el formato de calcular_distancias
+        self.fallidos = {}  # Código de centro -> motivo del último fallo
+        self.terminado = False
+        self._sin_guardar = 0
+        self._ultimo_guardado = time.monotonic()
+
+    @classmethod
+    def abrir(cls, origen, filtros, reanudar=False, ruta=None):
+        """
+        Abre el trabajo del fichero si se pide reanudar y corresponde al mismo origen y
+        filtros; en otro caso empieza un trabajo nuevo (que sustituirá al fichero anterior).
+
+        Args:
+            origen (str): Dirección de origen del cálculo
+            filtros (dict): Filtros con los que se obtuvo el listado de centros
+            reanudar (bool): Continuar el trabajo guardado en `ruta`
+            ruta (str): Ruta del fichero de trabajo (por defecto CHECKPOINT_TRABAJO_PATH)
+
+        Returns:
+            CheckpointTrabajo: Trabajo con los resultados ya guardados (o vacío)
+        """
+        ruta = ruta or obtener_config().checkpoint_trabajo_path
+        trabajo = cls(ruta, origen, filtros)
+        if not reanudar:
+            return trabajo
+
+        try:
+            with open(ruta, encoding="utf-8") as fichero:
+                datos = json.load(fichero)
+        except FileNotFoundError:
+            logger.info("No hay ningún trabajo que reanudar en '%s'; se empieza desde cero.", ruta)
+            return trabajo
+        except (OSError, ValueError) as e:
+            logger.warning("No se pudo leer el trabajo guardado en '%s': %s", ruta, e)
+            return trabajo
+
+        if datos.get("origen") != origen or datos.get("filtros") != filtros:
+            logger.warning("El trabajo guardado en '%s' es de otro origen o de otros filtros; se empieza desde cero.", ruta)
+            return trabajo
+
+        trabajo.resultados = datos.get("resultados", {})
+        trabajo.fallidos = datos.get("fallidos", {})
+        return trabajo
+
+    def restaurar(self, centros):
+        """
+        Asigna a los centros los resultados ya guardados.
+
+        Args:
+            centros (list): Centros del cálculo (CentroEducativo o VistaCentro)
+
+        Returns:
+            tuple: (calculados, pendientes) - centros con resultado restaurado y centros por calcular
+        """
+        calculados, pendientes = [], []
+        for centro in centros:
+            resultado = self.resultados.get(str(centro.codigo_centro))
+            if resultado:
+                centro.asignar_distancia(resultado)
+                calculados.append(centro)
+            else:
+                pendientes.append(centro)
+        return calculados, pendientes
+
+    def registrar(self, centro):
+        """Anota el resultado (o el motivo del fallo) de un centro y guarda si toca."""
+        codigo = str(centro.codigo_centro)
+        if centro.error_distancia is None and centro.duracion_s is not None:
+            self.resultados[codigo] = {
+                "distancia en Km": centro.distancia_km,
+                "distancia en m": int(centro.distancia_m),
+                "duracion": centro.duracion,
+                "duracion en s": int(centro.duracion_s),
+            }
+            self.fallidos.pop(codigo, None)
+        else:
+            self.fallidos[codigo] = centro.error_distancia
+
+        self._sin_guardar += 1
+        if self._sin_guardar >= self.cada or time.monotonic() - self._ultimo_guardado >= self.segundos:
+            self.guardar()
+
+    def guardar(self, terminado=False):
+        """Vuelca el estado del trabajo al fichero."""
+        self.terminado = terminado
+        datos = {
+            "origen": self.origen,
+            "filtros": self.filtros,
+            "terminado": terminado,
+            "actualizado": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "resultados": self.resultados,
+            "fallidos": self.fallidos,
+        }
+        temporal = f"{self.ruta}.tmp"
+        with open(temporal, "w", encoding="utf-8") as fichero:
+            json.dump(datos, fichero, ensure_ascii=False)
+        os.replace(temporal, self.ruta)
+        self._sin_guardar = 0
+        self._ultimo_guardado = time.monotonic()
@@ -0,0 +1,161 @@
+# Configuración de la aplicación, leída una sola vez de las variables de entorno (y del .env).
+# Los módulos no leen el entorno al importarse: piden la configuración con `obtener_config()`
+# en el momento de usarla, de modo que importar cualquier módulo no tiene efectos secundarios
+# y la configuración se puede volver a cargar sin reiniciar el proceso (`recargar_config()`).
+
+import os
+import sys
+import threading
+from dataclasses import dataclass, fields
+
+
+@dataclass(frozen=True)
+class Configuracion:
+    """
+    Valores de configuración de todos los servicios.
+
+    Cada campo corresponde a una variable de entorno (en mayúsculas) con su valor por defecto.
+    """
+
+    # Google Maps
+    google_maps_api_key: str = None
+    google_maps_base_url: str = "https://maps.googleapis.com"
+    google_maps_qps: int = 10  # Consultas por segundo como máximo
+    google_maps_retry_timeout: int = 60  # Segundos máximos reintentando OVER_QUERY_LIMIT
+    google_maps_pool_size: int = 10  # Conexiones keep-alive reutilizables
+    google_maps_max_workers: int = 8  # Consultas simultáneas en el modo concurrente
+
+    # API de datos abiertos de la Junta de Andalucía
+    junta_api_base: str = "https://www.juntadeandalucia.es/datosabiertos/portal/api/3/action"
+    resource_id: str = "82f92e32-c5ee-4c60-8643-bfb19e130cef"  # ID del recurso de centros
+    junta_tam_pagina: int = 1000  # Registros pedidos en cada página de datastore_search
+    junta_snapshot: bool = True  # Usar la copia local del conjunto de datos
+    junta_offline: bool = False  # Leer solo la copia local, sin consultar la red
+    junta_snapshot_intervalo_min: float = 60  # Minutos entre comprobaciones de la versión en el portal
+    junta_snapshot_path: str = "snapshot_junta.sqlite"
+
+    # Caché de rutas y geocodificaciones
+    cache_google_path: str = "cache_google.sqlite"
+    cache_google_ttl_dias: float = 30
+    cache_google_max_entradas: int = 200000
+
+    # Estimador offline
+    estimador_factor_carretera: float = 1.3  # Relación media entre distancia por carretera y en línea recta
+    estimador_velocidad_media_kmh: float = 60  # Velocidad media para pasar kilómetros a minutos
+    estimador_velocidad_maxima_kmh: float = 120  # Velocidad máxima: la línea recta da una cota inferior del tiempo
+
+    # Trabajos por lotes y tabla de códigos postales
+    checkpoint_trabajo_path: str = "trabajo_centros.json"
+    checkpoint_trabajo_cada: int = 100  # Centros calculados entre guardados
+    checkpoint_trabajo_segundos: float = 30  # Segundos máximos entre guardados
+    tabla_cp_dir: str = "tabla_codigos_postales"
+
+    # Mensajes
+    log_level: str = "INFO"
+
+    @classmethod
+    def desde_entorno(cls):
+        """Construye la configuración a partir de las variables de entorno, con los valores por defecto de la clase."""
+        valores = {}
+        for campo in fields(cls):
+            # resource_id se mantiene en minúsculas por compatibilidad con los .env existentes
+            nombre = campo.name if campo.name == "resource_id" else campo.name.upper()
+            texto = os.getenv(nombre)
+            if texto in (None, ""):
+                continue
+            if campo.type is bool:
+                valores[campo.name] = _leer_booleano(nombre, texto)
+            elif campo.type in (int, float):
+                valores[campo.name] = campo.type(texto)
+            else:
+                valores[campo.name] = texto
+        return cls(**valores)
+
+
+# Formas admitidas de escribir un valor booleano en el entorno
+_VERDADEROS = {"1", "true", "yes", "si", "sí", "on"}
+_FALSOS = {"0", "false", "no", "off"}
+
+
+def _leer_booleano(nombre, texto):
+    valor = texto.strip().lower()
+    if valor in _VERDADEROS:
+        return True
+    if valor in _FALSOS:
+        return False
+    raise ValueError(f"Valor booleano no válido para {nombre}: {texto!r} (usa 1/0, true/false, sí/no u on/off)")
+
+
+# Instancias compartidas construidas a partir de la configuración, como (módulo, variable).
+# Al recargar la configuración se descartan y se vuelven a crear la próxima vez que se piden.
+_INSTANCIAS = (
+    ("services.googleConnect", "_cliente"),
+    ("services.googleConnect", "_limitador"),
+    ("services.cacheRutas", "_cache"),
+    ("services.snapshotJunta", "_snapshot"),
+    ("services.tablaCodigosPostales", "_tabla"),
+    ("services.ConexionJuntaPandas", "_df_centros"),
+    ("services.almacenCentros", "_almacen"),
+)
+
+# Variables que se pusieron en el entorno desde el .env (y no venían del entorno del proceso)
+_claves_dotenv = set()
+
+# Configuración compartida, cargada la primera vez que se pide
+_config = None
+_config_lock = threading.Lock()
+
+
+def obtener_config() -> Configuracion:
+    """Devuelve la configuración compartida, cargando el .env y el entorno la primera vez."""
+    global _config
+    if _config is None:
+        with _config_lock:
+            if _config is None:
+                _config = _cargar()
+    return _config
+
+
+def recargar_config() -> Configuracion:
+    """
+    Vuelve a leer el .env y las variables de entorno (por ejemplo, tras cambiar la API Key).
+
+    Los valores que vienen del .env se sustituyen por los actuales (y se quitan del entorno
+    si ya no están en el fichero); las variables del entorno del proceso siguen teniendo
+    prioridad sobre el .env.
+
+    Descarta además el cliente y el limitador de Google Maps, la caché de rutas, la copia
+    local de la Junta, la tabla de códigos postales, el DataFrame y el almacén de centros,
+    que se crean de nuevo con la configuración recargada la próxima vez que se usan. Las
+    bases de datos abiertas se cierran, así que no debe llamarse con consultas en curso.
+    """
+    global _config
+    with _config_lock:
+        _config = _cargar()
+        for nombre_modulo, variable in _INSTANCIAS:
+            # Un módulo que aún no se ha importado no tiene ninguna instancia creada
+            modulo = sys.modules.get(nombre_modulo)
+            if modulo is None:
+                continue
+            instancia = getattr(modulo, variable)
+            setattr(modulo, variable, None)
+            if hasattr(instancia, "cerrar"):
+                instancia.cerrar()
+    return _config
+
+
+def _cargar():
+    # Importación local: python-dotenv solo se carga cuando se lee la configuración
+    from dotenv import dotenv_values
+
+    # Igual que load_dotenv(), pero recordando qué variables salen del .env para poder
+    # sustituirlas al recargar (load_dotenv no pisa las que ya están en el entorno)
+    valores = {clave: valor for clave, valor in dotenv_values().items() if valor is not None}
+    for clave in _claves_dotenv - valores.keys():
+        os.environ.pop(clave, None)
+        _claves_dotenv.discard(clave)
+    for clave, valor in valores.items():
+        if clave not in os.environ or clave in _claves_dotenv:
+            os.environ[clave] = valor
+            _claves_dotenv.add(clave)
+    return Configuracion.desde_entorno()
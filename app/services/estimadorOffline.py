@@ -0,0 +1,289 @@
+# Estimación local (sin Google Maps) del tiempo de viaje hasta los centros educativos.
+# Cada centro se geocodifica una sola vez (el resultado queda en la caché persistente) y a
+# partir de ahí las distancias se calculan en línea recta con la fórmula del haversine,
+# corregidas por un factor de carretera, con un único cálculo vectorizado para todos los centros.
+
+import heapq
+import numpy as np
+
+from services.cacheRutas import obtener_cache
+from services.configuracion import obtener_config
+from services.googleConnect import obtener_coordenadas
+from models.CentroEducativo import CentroEducativo
+
+RADIO_TIERRA_KM = 6371.0
+# El factor de carretera (ESTIMADOR_FACTOR_CARRETERA), la velocidad media (ESTIMADOR_VELOCIDAD_MEDIA_KMH)
+# y la velocidad máxima (ESTIMADOR_VELOCIDAD_MAXIMA_KMH) se leen de la configuración al estimar
+
+
+# Distancia en línea recta desde un punto hasta muchos puntos a la vez
+def haversine_km(lat_origen: float, lng_origen: float, latitudes, longitudes) -> np.ndarray:
+    """
+    Calcula la distancia ortodrómica desde un origen hasta un conjunto de puntos.
+
+    Args:
+        lat_origen (float): Latitud del origen en grados
+        lng_origen (float): Longitud del origen en grados
+        latitudes (array-like): Latitudes de los destinos en grados
+        longitudes (array-like): Longitudes de los destinos en grados
+
+    Returns:
+        np.ndarray: Distancias en kilómetros, una por destino (NaN si el destino no tiene coordenadas)
+
+    Example:
+        >>> haversine_km(37.18, -3.60, [37.39], [-5.98]).round(0)
+        array([212.])
+    """
+    lat1 = np.radians(lat_origen)
+    lng1 = np.radians(lng_origen)
+    lat2 = np.radians(np.asarray(latitudes, dtype=float))
+    lng2 = np.radians(np.asarray(longitudes, dtype=float))
+
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) / 2) ** 2
+    return 2 * RADIO_TIERRA_KM * np.arcsin(np.sqrt(a))
+
+
+# Pasar distancias en línea recta a una estimación de minutos por carretera
+def estimar_minutos(distancias_km, factor_carretera: float = None, velocidad_kmh: float = None) -> np.ndarray:
+    """
+    Estima el tiempo de viaje en coche a partir de la distancia en línea recta.
+
+    Args:
+        distancias_km (array-like): Distancias en línea recta en kilómetros
+        factor_carretera (float): Factor de corrección de línea recta a carretera (por defecto ESTIMADOR_FACTOR_CARRETERA)
+        velocidad_kmh (float): Velocidad media supuesta en km/h (por defecto ESTIMADOR_VELOCIDAD_MEDIA_KMH)
+
+    Returns:
+        np.ndarray: Minutos estimados para cada distancia
+    """
+    config = obtener_config()
+    factor_carretera = config.estimador_factor_carretera if factor_carretera is None else factor_carretera
+    velocidad_kmh = config.estimador_velocidad_media_kmh if velocidad_kmh is None else velocidad_kmh
+    return np.asarray(distancias_km, dtype=float) * factor_carretera / velocidad_kmh * 60
+
+
+# Geocodificar los centros que todavía no tienen coordenadas
+def geocodificar_centros(centros: list) -> list:
+    """
+    Asigna latitud y longitud a los centros que aún no las tienen.
+
+    Las coordenadas se obtienen con `obtener_coordenadas`, que las guarda en la caché
+    persistente, así que cada dirección solo se consulta a Google Maps la primera vez.
+
+    Args:
+        centros (list): Lista de objetos CentroEducativo
+
+    Returns:
+        list: Centros que no se pudieron geocodificar
+    """
+    sin_coordenadas = []
+    for centro in centros:
+        if centro.latitud is None or centro.longitud is None:
+            centro.latitud, centro.longitud = obtener_coordenadas(centro.direccion_destino())
+            if centro.latitud is None:
+                sin_coordenadas.append(centro)
+    return sin_coordenadas
+
+
+# Asignar a los centros las coordenadas que ya están en la caché, sin consultar a Google Maps
+def coordenadas_en_cache(centros: list) -> list:
+    """
+    Asigna latitud y longitud a los centros cuya dirección ya se geocodificó antes
+    (caché persistente). Los demás quedan sin coordenadas.
+
+    Args:
+        centros (list): Lista de objetos CentroEducativo
+
+    Returns:
+        list: Centros que siguen sin coordenadas
+    """
+    cache = obtener_cache()
+    sin_coordenadas = []
+    for centro in centros:
+        if centro.latitud is None or centro.longitud is None:
+            coordenadas = cache.obtener_coordenadas(centro.direccion_destino())
+            if coordenadas is None:
+                sin_coordenadas.append(centro)
+                continue
+            centro.latitud, centro.longitud = coordenadas
+    return sin_coordenadas
+
+
+# Descartar los centros más alejados del origen que el radio indicado antes de consultar sus rutas
+def filtrar_por_radio(direccion_origen: str, centros: list, radio_km: float) -> list:
+    """
+    Devuelve los centros a menos de `radio_km` kilómetros en línea recta del origen.
+
+    Solo se usan las coordenadas de los centros ya guardadas en la caché (ver
+    `precalcular_coordenadas`): no se geocodifica ningún centro. Los centros sin
+    coordenadas no se pueden descartar y se conservan, igual que todos los centros si
+    no se puede geocodificar el origen. Para una consulta suelta basta un cálculo
+    vectorizado; el servidor usa en su lugar el índice espacial del almacén de centros.
+
+    Args:
+        direccion_origen (str): Dirección desde la que se mide el radio
+        centros (list): Lista de objetos CentroEducativo
+        radio_km (float): Radio máximo en kilómetros
+
+    Returns:
+        list: Centros dentro del radio o sin coordenadas, en el orden de `centros`
+    """
+    lat_origen, lng_origen = obtener_coordenadas(direccion_origen)
+    if lat_origen is None:
+        return list(centros)
+
+    coordenadas_en_cache(centros)
+    latitudes = np.array([np.nan if centro.latitud is None else centro.latitud for centro in centros], dtype=float)
+    longitudes = np.array([np.nan if centro.longitud is None else centro.longitud for centro in centros], dtype=float)
+    # Las comparaciones con NaN son falsas: los centros sin coordenadas no quedan fuera
+    fuera = haversine_km(lat_origen, lng_origen, latitudes, longitudes) > radio_km
+    return [centro for centro, descartado in zip(centros, fuera) if not descartado]
+
+
+# Geocodificar por adelantado todos los centros del conjunto de datos
+def precalcular_coordenadas():
+    """
+    Geocodifica los centros que todavía no están en la caché, para que `ordenar_top_k`
+    disponga de coordenadas sin geocodificar durante las consultas.
+
+    Returns:
+        int: Número de centros que no se pudieron geocodificar
+    """
+    # Importación local: el listado de la Junta solo se necesita al precalcular
+    from services.ConexionJuntaPandas import consulta_todos_centros
+    from models.ColeccionCentros import ColeccionCentros
+
+    centros = ColeccionCentros.desde_dataframe(consulta_todos_centros()).vistas()
+    return len(geocodificar_centros(centros))
+
+
+# Ordenar los centros por tiempo estimado, opcionalmente afinando con Google los primeros
+def ordenar_centros_offline(direccion_origen: str, centros: list, top_n: int = None) -> list:
+    """
+    Ordena los centros por tiempo de viaje estimado sin consultar rutas a Google Maps.
+
+    Rellena en cada centro los atributos `distancia_estimada_km` y `duracion_estimada_min`.
+    Si se indica `top_n`, los `top_n` primeros centros se consultan además a Google Maps
+    en una petición por lotes y se reordenan por su duración real.
+
+    Args:
+        direccion_origen (str): Dirección desde la que se estiman los tiempos
+        centros (list): Lista de objetos CentroEducativo
+        top_n (int): Número de centros a afinar con Google Maps (None para no consultar rutas)
+
+    Returns:
+        list: Centros con coordenadas ordenados por tiempo (los `top_n` primeros por tiempo real)
+
+    Example:
+        >>> ordenados = ordenar_centros_offline("Calle Example 123, Ciudad", centros, top_n=20)
+        >>> ordenados[0].duracion_estimada_min
+        4.2
+    """
+    lat_origen, lng_origen = obtener_coordenadas(direccion_origen)
+    if lat_origen is None:
+        return []
+
+    geocodificar_centros(centros)
+    con_coordenadas = [centro for centro in centros if centro.latitud is not None]
+    if not con_coordenadas:
+        return []
+
+    # Un único cálculo vectorizado para todos los centros
+    latitudes = np.fromiter((centro.latitud for centro in con_coordenadas), dtype=float, count=len(con_coordenadas))
+    longitudes = np.fromiter((centro.longitud for centro in con_coordenadas), dtype=float, count=len(con_coordenadas))
+    distancias_recta_km = haversine_km(lat_origen, lng_origen, latitudes, longitudes)
+    distancias_km = distancias_recta_km * obtener_config().estimador_factor_carretera
+    minutos = estimar_minutos(distancias_recta_km)
+
+    orden = np.argsort(minutos, kind="stable")
+    ordenados = [con_coordenadas[i] for i in orden]
+    for i in orden:
+        con_coordenadas[i].distancia_estimada_km = round(float(distancias_km[i]), 1)
+        con_coordenadas[i].duracion_estimada_min = round(float(minutos[i]), 1)
+
+    if top_n:
+        # Afinar con Google Maps solo los mejores candidatos y reordenarlos por su duración real
+        candidatos = ordenados[:top_n]
+        CentroEducativo.calcula_distancias_lote(candidatos, direccion_origen)
+        candidatos.sort(key=CentroEducativo.clave_duracion)
+        ordenados = candidatos + ordenados[top_n:]
+
+    return ordenados
+
+
+# Obtener los k centros más cercanos en tiempo real consultando el mínimo de rutas posible
+def ordenar_top_k(direccion_origen: str, centros: list, k: int, tam_lote: int = 25) -> tuple:
+    """
+    Devuelve los `k` centros con menor duración real del trayecto sin consultar la ruta
+    de todos los centros.
+
+    Cada centro recibe una cota inferior de su duración (distancia en línea recta a
+    ESTIMADOR_VELOCIDAD_MAXIMA_KMH). Los centros se consultan a Google Maps en lotes por orden de
+    cota y se mantiene un montículo con los `k` mejores tiempos reales; en cuanto el
+    k-ésimo mejor tiempo es menor o igual que la cota del siguiente centro sin consultar,
+    ningún centro restante puede mejorarlo y la búsqueda termina. Los centros que no se
+    pudieron geocodificar tienen cota 0 y se consultan siempre.
+
+    Las cotas solo usan coordenadas ya guardadas en la caché (ver `precalcular_coordenadas`):
+    durante la consulta no se geocodifica ningún centro, así que un centro sin coordenadas
+    en caché tiene cota 0 y se consulta en los primeros lotes.
+
+    Args:
+        direccion_origen (str): Dirección desde la que se calculan las distancias
+        centros (list): Lista de objetos CentroEducativo
+        k (int): Número de centros a devolver
+        tam_lote (int): Centros consultados en cada petición por lotes
+
+    Returns:
+        tuple: (ordenados, consultados)
+            - ordenados (list): Hasta `k` centros ordenados por duración real
+            - consultados (int): Número de centros cuya ruta se ha calculado
+
+    Example:
+        >>> ordenados, consultados = ordenar_top_k("Calle Example 123, Ciudad", centros, 20)
+        >>> len(ordenados), consultados
+        (20, 75)
+    """
+    if k <= 0 or not centros:
+        return [], 0
+
+    # Cota inferior en segundos para cada centro (0 si no hay coordenadas)
+    cotas = np.zeros(len(centros), dtype=float)
+    lat_origen, lng_origen = obtener_coordenadas(direccion_origen)
+    if lat_origen is not None:
+        coordenadas_en_cache(centros)
+        latitudes = np.array([centro.latitud if centro.latitud is not None else np.nan for centro in centros], dtype=float)
+        longitudes = np.array([centro.longitud if centro.longitud is not None else np.nan for centro in centros], dtype=float)
+        cotas = np.nan_to_num(haversine_km(lat_origen, lng_origen, latitudes, longitudes) / obtener_config().estimador_velocidad_maxima_kmh * 3600, nan=0.0)
+
+    orden = np.argsort(cotas, kind="stable")
+
+    # Montículo de máximos (duraciones negadas) con los k mejores centros encontrados
+    mejores = []
+    consultados = 0
+    for inicio in range(0, len(orden), tam_lote):
+        if len(mejores) >= k and -mejores[0][0] <= cotas[orden[inicio]]:
+            break
+
+        lote = [centros[i] for i in orden[inicio:inicio + tam_lote]]
+        CentroEducativo.calcula_distancias_lote(lote, direccion_origen)
+        consultados += len(lote)
+
+        for posicion, centro in zip(orden[inicio:inicio + tam_lote], lote):
+            if centro.duracion_s is None:
+                continue
+            entrada = (-centro.duracion_s, -int(posicion))
+            if len(mejores) < k:
+                heapq.heappush(mejores, entrada)
+            elif entrada > mejores[0]:
+                heapq.heapreplace(mejores, entrada)
+
+    ordenados = [centros[-posicion] for _, posicion in sorted(mejores, reverse=True)]
+    return ordenados, consultados
+
+
+if __name__ == "__main__":
+    from services.metricas import configurar_logging
+
+    configurar_logging()
+    print(f"Centros sin coordenadas: {precalcular_coordenadas()}")
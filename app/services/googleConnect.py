@@ -2,76 +2,447 @@
 # Utiliza la API de geocodificación de Google Maps para convertir la dirección del usuario en coordenadas. 
 # Esta conversión es necesaria si el usuario introduce una dirección en lugar de coordenadas.
 
-import googlemaps
-import googlemaps.distance_matrix
-import googlemaps.geocoding
-from dotenv import load_dotenv
-import os
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from services.cacheRutas import obtener_cache
+from services.configuracion import obtener_config
+from services.metricas import contar, cronometro
+from services.normalizacionDirecciones import agrupar_destinos
 
-# Cargar las variables de entorno desde el archivo .env
-load_dotenv()
+# googlemaps y requests se importan al crear el cliente: importar este módulo no los carga
 
-GOOGLE_MAPS_API_KEY = os.getenv("GOOGLE_MAPS_API_KEY")
+logger = logging.getLogger(__name__)
+
+# Límites de la API Distance Matrix por petición
+MAX_DESTINOS_POR_PETICION = 25
+MAX_ELEMENTOS_POR_PETICION = 100
+
+
+class LimitadorTasa:
+    """
+    Limitador de tasa global y seguro entre hilos.
+
+    Reparte las consultas de forma uniforme para no superar `consultas_por_segundo`,
+    sea cual sea el número de hilos que consultan a la vez a Google Maps.
+
+    Args:
+        consultas_por_segundo (float): Número máximo de consultas por segundo
+    """
+
+    def __init__(self, consultas_por_segundo):
+        self.intervalo = 1.0 / consultas_por_segundo if consultas_por_segundo > 0 else 0.0
+        self._siguiente = 0.0
+        self._lock = threading.Lock()
+
+    def esperar(self):
+        """Bloquea el hilo actual hasta que le toque su turno para consultar."""
+        with self._lock:
+            ahora = time.monotonic()
+            turno = max(ahora, self._siguiente)
+            self._siguiente = turno + self.intervalo
+        if turno > ahora:
+            time.sleep(turno - ahora)
+
+
+# Limitador compartido por todas las consultas a Google Maps, creado la primera vez que se necesita
+_limitador = None
+_limitador_lock = threading.Lock()
+
+
+def obtener_limitador() -> LimitadorTasa:
+    """Devuelve el limitador de tasa compartido, con GOOGLE_MAPS_QPS consultas por segundo."""
+    global _limitador
+    if _limitador is None:
+        with _limitador_lock:
+            if _limitador is None:
+                _limitador = LimitadorTasa(obtener_config().google_maps_qps)
+    return _limitador
+
+
+# Contar cada respuesta HTTP de Google Maps, incluidas las de los reintentos internos del cliente
+def _contar_respuesta(respuesta, *args, **kwargs):
+    contar("google.respuestas_http")
+    # El cliente reintenta los errores 5xx y, con retry_over_query_limit, las respuestas OVER_QUERY_LIMIT
+    if respuesta.status_code in (500, 503, 504) or (len(respuesta.content) < 1000 and b"OVER_QUERY_LIMIT" in respuesta.content):
+        contar("google.reintentos")
+
+
+# Cliente compartido, creado la primera vez que se necesita
+_cliente = None
+_cliente_lock = threading.Lock()
+
+
+def obtener_cliente():
+    """
+    Devuelve el cliente de Google Maps compartido por todas las consultas, creándolo si no existe.
+
+    El cliente reutiliza una única sesión HTTP con conexiones keep-alive, limita las
+    consultas por segundo a GOOGLE_MAPS_QPS y reintenta con espera exponencial las
+    respuestas OVER_QUERY_LIMIT y los errores 5xx durante GOOGLE_MAPS_RETRY_TIMEOUT segundos.
+
+    Returns:
+        googlemaps.Client: Cliente inicializado con la API Key
+    """
+    global _cliente
+    if _cliente is None:
+        with _cliente_lock:
+            if _cliente is None:
+                import googlemaps
+                import requests
+                from requests.adapters import HTTPAdapter
+
+                config = obtener_config()
+                # Sesión HTTP con un pool de conexiones persistentes
+                sesion = requests.Session()
+                adaptador = HTTPAdapter(pool_connections=config.google_maps_pool_size, pool_maxsize=config.google_maps_pool_size)
+                sesion.mount("https://", adaptador)
+                sesion.mount("http://", adaptador)
+                sesion.hooks["response"].append(_contar_respuesta)
+
+                _cliente = googlemaps.Client(
+                    config.google_maps_api_key,
+                    queries_per_second=config.google_maps_qps,
+                    retry_over_query_limit=True,
+                    retry_timeout=config.google_maps_retry_timeout,
+                    requests_session=sesion,
+                    base_url=config.google_maps_base_url,
+                )
+    return _cliente
 
 
 # Función para obtener las coordenadas de una dirección proporcionada por el usuario
 def obtener_coordenadas(direccion_usuario: str) -> tuple:
+    # Consultar primero la caché persistente
+    cache = obtener_cache()
+    coordenadas = cache.obtener_coordenadas(direccion_usuario)
+    if coordenadas is not None:
+        return coordenadas
+
     try:
-        # Inicializar el cliente de Google Maps con la API Key
-        gmaps = googlemaps.Client(GOOGLE_MAPS_API_KEY)
+        # Reutilizar el cliente compartido de Google Maps
+        gmaps = obtener_cliente()
         
         # Realizar la geocodificación de la dirección proporcionada para obtener resultados de ubicación
-        geocode_result = googlemaps.geocoding.geocode(gmaps,direccion_usuario)
+        obtener_limitador().esperar()
+        contar("google.geocode")
+        with cronometro("google.geocode"):
+            geocode_result = gmaps.geocode(direccion_usuario)
         
         # Verificar si la respuesta contiene resultados
         if geocode_result:
             # Extraer la latitud y longitud del primer resultado
             lat = geocode_result[0]['geometry']['location']['lat']
             lng = geocode_result[0]['geometry']['location']['lng']
-            print(lat)
-            print(lng)
+            logger.debug("Coordenadas de '%s': %s, %s", direccion_usuario, lat, lng)
+            cache.guardar_coordenadas(direccion_usuario, (lat, lng))
             return lat, lng
         else:
-            # Imprimir un mensaje si no se encontraron coordenadas para la dirección
-            print("No se pudieron obtener coordenadas para la dirección proporcionada.")
+            # Avisar si no se encontraron coordenadas para la dirección
+            contar("google.fallos_geocode")
+            logger.warning("No se pudieron obtener coordenadas para la dirección '%s'", direccion_usuario)
     except Exception as e:
-        # Capturar cualquier excepción y mostrar el mensaje de error
-        print(f"Error al obtener coordenadas: {e}")
+        # Capturar cualquier excepción y registrar el error
+        contar("google.fallos_geocode")
+        logger.error("Error al obtener coordenadas de '%s': %s", direccion_usuario, e)
 
 
     # Devolver None, None si no se pudo obtener la geocodificación
     return None, None
 
 
-# Función para calcular la distancia entre dos direcciones proporcionadas 
-def calcular_distancias(direccion_origen: str, direccion_destino: str) -> dict:
+# Convertir un elemento de la respuesta de Distance Matrix al diccionario de resultado
+def _procesar_elemento(elemento: dict) -> dict:
+    # Solo los elementos con estado OK traen distancia y duración
+    if elemento.get('status') != 'OK':
+        return {}
+    return {
+        "distancia en Km": elemento['distance']['text'],  # Distancia en formato legible (ej. '10 km'), solo para mostrar
+        "distancia en m": elemento['distance']['value'],  # Distancia en metros
+        "duracion": elemento['duration']['text'],  # Duración estimada del viaje en formato legible (ej. '15 mins'), solo para mostrar
+        "duracion en s": elemento['duration']['value']  # Duración estimada del viaje en segundos
+    }
+
+
+# Consultar la distancia entre dos direcciones devolviendo también el motivo del fallo
+def _consultar_distancia(direccion_origen: str, direccion_destino: str) -> tuple:
+    # Consultar primero la caché persistente
+    cache = obtener_cache()
+    resultado = cache.obtener_ruta(direccion_origen, direccion_destino)
+    if resultado is not None:
+        return resultado, None
+
     try:
-        # Inicializar el cliente de Google Maps con la API Key
-        gmaps = googlemaps.Client(GOOGLE_MAPS_API_KEY)
+        # Reutilizar el cliente compartido de Google Maps
+        gmaps = obtener_cliente()
 
         # Realizar la consulta de distancia entre el origen y el destino
-        result = googlemaps.distance_matrix.distance_matrix(gmaps,origins=direccion_origen, destinations=direccion_destino,language="ES", mode="driving")
-        
-        # Verificar si la respuesta contiene resultados
-        if result['rows'] and result['rows'][0]['elements'] and result['rows'][0]['elements'][0]['status'] == 'OK':
-            # Extraer la distancia y la duración de los resultados
-            distancia_km = result['rows'][0]['elements'][0]['distance']['text']  # Extraer la distancia en formato legible (ej. '10 km')
-            distancia_value = result['rows'][0]['elements'][0]['distance']['value']  # Extraer la distancia en formato valor en metros
-            duracion = result['rows'][0]['elements'][0]['duration']['text']  # Extraer la duración estimada del viaje en formato legible (ej. '15 mins')
-            return {
-                "distancia en Km": distancia_km,  # Devolver la distancia como parte del resultado
-                "distancia en m": distancia_value,  # Devolver la distancia como parte del resultado
-                "duracion": duracion  # Devolver la duración como parte del resultado
-            }
-        else:
-            # Imprimir un mensaje si no se pudo calcular la distancia
-            print("No se pudo calcular la distancia para las direcciones proporcionadas.")
+        obtener_limitador().esperar()
+        contar("google.peticiones")
+        contar("google.elementos")
+        with cronometro("google.distance_matrix"):
+            result = gmaps.distance_matrix(origins=direccion_origen, destinations=direccion_destino,language="ES", mode="driving")
     except Exception as e:
-        # Capturar cualquier excepción y mostrar el mensaje de error
-        print(f"Error al calcular la distancia: {e}")
-        
+        contar("google.fallos")
+        return {}, str(e)
+
+    # Verificar si la respuesta contiene resultados
+    elemento = result['rows'][0]['elements'][0] if result['rows'] and result['rows'][0]['elements'] else {}
+    resultado = _procesar_elemento(elemento)
+    if not resultado:
+        contar("google.fallos")
+        return {}, elemento.get('status', 'SIN_RESPUESTA')
+
+    cache.guardar_ruta(direccion_origen, direccion_destino, resultado)
+    return resultado, None
+
+
+# Función para calcular la distancia entre dos direcciones proporcionadas 
+def calcular_distancias(direccion_origen: str, direccion_destino: str) -> dict:
+    resultado, motivo = _consultar_distancia(direccion_origen, direccion_destino)
+    if motivo is not None:
+        # Avisar si no se pudo calcular la distancia
+        logger.warning("No se pudo calcular la distancia de '%s' a '%s': %s", direccion_origen, direccion_destino, motivo)
+
     # Devolver un diccionario vacío si no se pudo calcular la distancia
-    return {}
+    return resultado
+
+
+# Generador con las distancias desde varios orígenes hasta muchos destinos, según se resuelven
+def iterar_matriz_distancias(direcciones_origen: list, direcciones_destino: list, claves: list = None):
+    """
+    Calcula las distancias desde varias direcciones de origen hasta una lista de destinos
+    agrupando origen x destino en el menor número posible de peticiones a Distance Matrix,
+    y devuelve cada par en cuanto está resuelto.
+
+    Los destinos que son la misma dirección escrita de otra forma (o que comparten
+    coordenadas, según `claves`) se consultan una sola vez y su resultado se devuelve
+    para cada uno de ellos.
+
+    La API admite como máximo 25 orígenes, 25 destinos y 100 elementos (origen x destino)
+    por petición: los orígenes se agrupan de 25 en 25 y, para cada grupo, los destinos se
+    reparten en bloques de hasta min(25, 100 // orígenes del grupo). Los pares que ya están
+    en la caché persistente se devuelven primero, sin esperar a ninguna petición; el resto
+    se devuelve bloque a bloque según van llegando las respuestas.
+
+    Args:
+        direcciones_origen (list): Lista de direcciones de origen
+        direcciones_destino (list): Lista de direcciones de destino
+        claves (list): Clave de agrupación de cada destino (por defecto su dirección
+                       canónica, ver services.normalizacionDirecciones)
+
+    Yields:
+        tuple: (índice del origen, índice del destino, resultado, motivo), con el resultado
+               en el formato de `calcular_distancias` y motivo None si se pudo calcular
+               (resultado vacío y el motivo del fallo en caso contrario)
+    """
+    unicos, grupos = agrupar_destinos(direcciones_destino, claves)
+    contar("rutas.destinos_agrupados", len(direcciones_destino) - len(unicos))
+    for i, indice_unico, resultado, motivo in _iterar_matriz_unicos(direcciones_origen, unicos):
+        for indice in grupos[indice_unico]:
+            yield i, indice, resultado, motivo
+
+
+def _iterar_matriz_unicos(direcciones_origen, direcciones_destino):
+    # Cálculo de `iterar_matriz_distancias` sobre destinos ya sin repetir
+    cache = obtener_cache()
+
+    for inicio_origen in range(0, len(direcciones_origen), MAX_DESTINOS_POR_PETICION):
+        indices_origen = list(range(inicio_origen, min(inicio_origen + MAX_DESTINOS_POR_PETICION, len(direcciones_origen))))
+        origenes = [direcciones_origen[i] for i in indices_origen]
+
+        # Resolver desde la caché persistente; un destino queda pendiente si le falta algún origen
+        pendientes = []
+        resueltos = set()
+        for indice, direccion_destino in enumerate(direcciones_destino):
+            completo = True
+            for i, origen in zip(indices_origen, origenes):
+                resultado = cache.obtener_ruta(origen, direccion_destino)
+                if resultado is not None:
+                    resueltos.add((i, indice))
+                    yield i, indice, resultado, None
+                else:
+                    completo = False
+            if not completo:
+                pendientes.append(indice)
+
+        if not pendientes:
+            continue
+
+        # El tamaño del bloque de destinos lo marcan los límites de destinos y de elementos
+        tam_bloque = min(MAX_DESTINOS_POR_PETICION, MAX_ELEMENTOS_POR_PETICION // len(origenes))
+
+        # Reutilizar el cliente compartido de Google Maps para todo el lote
+        gmaps = obtener_cliente()
+
+        for inicio in range(0, len(pendientes), tam_bloque):
+            indices_bloque = pendientes[inicio:inicio + tam_bloque]
+            bloque = [direcciones_destino[indice] for indice in indices_bloque]
+            try:
+                obtener_limitador().esperar()
+                contar("google.peticiones")
+                contar("google.elementos", len(origenes) * len(bloque))
+                with cronometro("google.distance_matrix"):
+                    result = gmaps.distance_matrix(origins=origenes, destinations=bloque, language="ES", mode="driving")
+                filas = result['rows']
+            except Exception as e:
+                # Si falla la petición, todos los pares del bloque sin caché quedan sin calcular
+                logger.error("Error en la petición a Distance Matrix (%d orígenes x %d destinos): %s", len(origenes), len(bloque), e)
+                for i in indices_origen:
+                    for indice in indices_bloque:
+                        if (i, indice) not in resueltos:
+                            contar("google.fallos")
+                            yield i, indice, {}, str(e)
+                continue
+
+            salida = []
+            nuevas = []
+            for fila_origen, (i, origen) in enumerate(zip(indices_origen, origenes)):
+                elementos = filas[fila_origen]['elements'] if fila_origen < len(filas) else []
+                for desplazamiento, indice in enumerate(indices_bloque):
+                    # Los pares ya devueltos desde la caché no se repiten
+                    if (i, indice) in resueltos:
+                        continue
+                    elemento = elementos[desplazamiento] if desplazamiento < len(elementos) else {}
+                    resultado = _procesar_elemento(elemento)
+                    if resultado:
+                        nuevas.append((origen, direcciones_destino[indice], resultado))
+                        salida.append((i, indice, resultado, None))
+                    else:
+                        contar("google.fallos")
+                        salida.append((i, indice, {}, elemento.get('status', 'SIN_RESPUESTA')))
+
+            # Las rutas del bloque se guardan en la caché en una sola transacción
+            cache.guardar_rutas(nuevas)
+            yield from salida
+
+
+# Función para calcular en lote las distancias desde varios orígenes hasta muchos destinos
+def calcular_matriz_distancias(direcciones_origen: list, direcciones_destino: list, claves: list = None) -> tuple:
+    """
+    Calcula las distancias desde varias direcciones de origen hasta una lista de destinos
+    agrupando origen x destino en el menor número posible de peticiones a Distance Matrix.
+
+    Recoge en una matriz todos los pares devueltos por `iterar_matriz_distancias`.
+
+    Args:
+        direcciones_origen (list): Lista de direcciones de origen
+        direcciones_destino (list): Lista de direcciones de destino
+        claves (list): Clave de agrupación de cada destino (por defecto su dirección canónica)
+
+    Returns:
+        tuple: (resultados, fallidos)
+            - resultados (list): Una fila por origen con un diccionario por destino, en el
+              mismo orden que las entradas, con el formato de `calcular_distancias`
+              (diccionario vacío si no se pudo calcular)
+            - fallidos (dict): (índice del origen, índice del destino) -> motivo del fallo
+
+    Example:
+        >>> resultados, fallidos = calcular_matriz_distancias(["Origen 1", "Origen 2"], ["Destino 1"])
+        >>> resultados[1][0]["duracion en s"]
+        912
+    """
+    resultados = [[{} for _ in direcciones_destino] for _ in direcciones_origen]
+    fallidos = {}
+    for i, indice, resultado, motivo in iterar_matriz_distancias(direcciones_origen, direcciones_destino, claves):
+        if motivo is None:
+            resultados[i][indice] = resultado
+        else:
+            fallidos[(i, indice)] = motivo
+    return resultados, fallidos
+
+
+# Generador con las distancias desde un origen hasta muchos destinos, según se resuelven
+def iterar_distancias_lote(direccion_origen: str, direcciones_destino: list, claves: list = None):
+    """
+    Versión incremental de `calcular_distancias_lote`: devuelve cada destino en cuanto
+    está resuelto (primero los de la caché y después bloque a bloque).
+
+    Args:
+        direccion_origen (str): Dirección desde la que se calculan las distancias
+        direcciones_destino (list): Lista de direcciones de destino
+        claves (list): Clave de agrupación de cada destino (por defecto su dirección canónica)
+
+    Yields:
+        tuple: (índice del destino, resultado, motivo), con motivo None si se pudo calcular
+    """
+    for _, indice, resultado, motivo in iterar_matriz_distancias([direccion_origen], direcciones_destino, claves):
+        yield indice, resultado, motivo
+
+
+# Función para calcular en lote las distancias desde un origen hasta muchos destinos
+def calcular_distancias_lote(direccion_origen: str, direcciones_destino: list, claves: list = None) -> tuple:
+    """
+    Calcula las distancias desde una dirección de origen hasta una lista de destinos
+    agrupando los destinos en el menor número posible de peticiones a Distance Matrix.
+
+    Es el caso de un único origen de `calcular_matriz_distancias`: los destinos se
+    reparten en bloques de 25 y los resultados se devuelven en el mismo orden que la
+    lista de entrada. Los destinos que ya están en la caché persistente no se vuelven
+    a consultar.
+
+    Args:
+        direccion_origen (str): Dirección desde la que se calculan las distancias
+        direcciones_destino (list): Lista de direcciones de destino
+        claves (list): Clave de agrupación de cada destino (por defecto su dirección canónica)
+
+    Returns:
+        tuple: (resultados, fallidos)
+            - resultados (list): Un diccionario por destino, en el mismo orden que
+              `direcciones_destino`, con el formato de `calcular_distancias`
+              (diccionario vacío si no se pudo calcular)
+            - fallidos (dict): Índice del destino -> motivo del fallo (estado del
+              elemento devuelto por la API o mensaje de la excepción)
+
+    Example:
+        >>> resultados, fallidos = calcular_distancias_lote(origen, ["Destino 1", "Destino 2"])
+        >>> resultados[0]["duracion"]
+        '15 min'
+    """
+    resultados, fallidos = calcular_matriz_distancias([direccion_origen], direcciones_destino, claves)
+    return resultados[0], {indice: motivo for (_, indice), motivo in fallidos.items()}
+
+
+# Función para calcular de forma concurrente las distancias desde un origen hasta muchos destinos
+def calcular_distancias_concurrente(direccion_origen: str, direcciones_destino: list, max_workers: int = None,
+                                    claves: list = None) -> tuple:
+    """
+    Calcula las distancias desde una dirección de origen hasta una lista de destinos
+    lanzando una consulta por destino en un pool de hilos acotado.
+
+    Es la alternativa a `calcular_distancias_lote` cuando las consultas no se pueden
+    agrupar. Todas las consultas pasan por el limitador de tasa global, de modo que
+    el número de hilos no cambia las consultas por segundo enviadas a Google Maps. Los
+    destinos repetidos se consultan una sola vez, como en `iterar_matriz_distancias`.
+
+    Args:
+        direccion_origen (str): Dirección desde la que se calculan las distancias
+        direcciones_destino (list): Lista de direcciones de destino
+        max_workers (int): Número máximo de consultas simultáneas (por defecto GOOGLE_MAPS_MAX_WORKERS)
+        claves (list): Clave de agrupación de cada destino (por defecto su dirección canónica)
+
+    Returns:
+        tuple: (resultados, fallidos) con el mismo formato que `calcular_distancias_lote`
+    """
+    if max_workers is None:
+        max_workers = obtener_config().google_maps_max_workers
+    resultados = [{} for _ in direcciones_destino]
+    fallidos = {}
+    unicos, grupos = agrupar_destinos(direcciones_destino, claves)
+    contar("rutas.destinos_agrupados", len(direcciones_destino) - len(unicos))
+
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        # executor.map devuelve los resultados en el mismo orden que la entrada
+        respuestas = executor.map(lambda destino: _consultar_distancia(direccion_origen, destino), unicos)
+        for grupo, (resultado, motivo) in zip(grupos, respuestas):
+            for indice in grupo:
+                if motivo is None:
+                    resultados[indice] = resultado
+                else:
+                    fallidos[indice] = motivo
+
+    return resultados, fallidos
 
 
 #-- PRUEBA DE LAS FUNCIONES --#
@@ -0,0 +1,87 @@
+# Índice espacial sobre las coordenadas de los centros educativos.
+# Reparte los puntos en una rejilla de celdas de tamaño fijo (en km) para responder
+# "puntos a menos de R km" mirando solo las celdas próximas al origen, en lugar de
+# calcular la distancia a todos. El almacén del servidor (services.almacenCentros) lo
+# construye una sola vez por conjunto de datos y lo reutiliza en cada petición con
+# `radio_km`; los filtros por provincia, tipo o programa se hacen aparte, en el almacén.
+
+import math
+from collections import defaultdict
+
+import numpy as np
+
+from services.estimadorOffline import haversine_km
+
+KM_POR_GRADO_LATITUD = 111.32
+
+
+class IndiceEspacial:
+    """
+    Índice en rejilla de un conjunto de puntos, identificados por su posición en los arrays.
+
+    Args:
+        latitudes (array-like): Latitud de cada punto (NaN si no se conoce)
+        longitudes (array-like): Longitud de cada punto (NaN si no se conoce)
+        tam_celda_km (float): Lado aproximado de cada celda de la rejilla en kilómetros
+    """
+
+    def __init__(self, latitudes, longitudes, tam_celda_km=10.0):
+        self.latitudes = np.asarray(latitudes, dtype=float)
+        self.longitudes = np.asarray(longitudes, dtype=float)
+        self.tam_celda_km = tam_celda_km
+
+        conocidas = ~(np.isnan(self.latitudes) | np.isnan(self.longitudes))
+        # Posiciones sin coordenadas: no están en la rejilla y ninguna consulta las descarta
+        self.sin_coordenadas = np.flatnonzero(~conocidas)
+
+        # Tamaño de celda en grados. Para la longitud se usa la latitud más alejada del ecuador,
+        # de modo que ninguna celda mida menos de `tam_celda_km` de ancho
+        lat_referencia = float(np.abs(self.latitudes[conocidas]).max()) if conocidas.any() else 0.0
+        self._grados_lat = tam_celda_km / KM_POR_GRADO_LATITUD
+        self._grados_lng = tam_celda_km / (KM_POR_GRADO_LATITUD * math.cos(math.radians(lat_referencia)))
+
+        celdas = defaultdict(list)
+        for posicion in np.flatnonzero(conocidas):
+            celdas[self._celda(self.latitudes[posicion], self.longitudes[posicion])].append(posicion)
+        self._celdas = {celda: np.array(posiciones, dtype=np.intp) for celda, posiciones in celdas.items()}
+
+    def __len__(self):
+        return len(self.latitudes) - len(self.sin_coordenadas)
+
+    def _celda(self, lat, lng):
+        return int(math.floor(lat / self._grados_lat)), int(math.floor(lng / self._grados_lng))
+
+    def _candidatos(self, fila, columna, anillos):
+        # Posiciones de los puntos en las celdas a `anillos` celdas o menos de la del origen
+        bloques = []
+        for df in range(-anillos, anillos + 1):
+            for dc in range(-anillos, anillos + 1):
+                posiciones = self._celdas.get((fila + df, columna + dc))
+                if posiciones is not None:
+                    bloques.append(posiciones)
+        return np.concatenate(bloques) if bloques else np.empty(0, dtype=np.intp)
+
+    def en_radio(self, lat, lng, radio_km):
+        """
+        Devuelve los puntos a menos de `radio_km` kilómetros en línea recta del origen.
+
+        Args:
+            lat (float): Latitud del origen
+            lng (float): Longitud del origen
+            radio_km (float): Radio de búsqueda en kilómetros
+
+        Returns:
+            tuple: (posiciones, distancias_km) ordenados de menor a mayor distancia
+
+        Example:
+            >>> indice.en_radio(37.18, -3.60, 15)
+            (array([812, 40, ...]), array([1.2, 4.1, ...]))
+        """
+        fila, columna = self._celda(lat, lng)
+        posiciones = self._candidatos(fila, columna, int(math.ceil(radio_km / self.tam_celda_km)))
+        distancias = haversine_km(lat, lng, self.latitudes[posiciones], self.longitudes[posiciones])
+        dentro = distancias <= radio_km
+        posiciones, distancias = posiciones[dentro], distancias[dentro]
+
+        orden = np.argsort(distancias, kind="stable")
+        return posiciones[orden], distancias[orden]
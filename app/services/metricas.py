@@ -0,0 +1,132 @@
+# Métricas de ejecución: cronómetros por etapa y contadores de llamadas, caché y fallos.
+# Sustituye a los mensajes por consola del cálculo de distancias: los módulos registran aquí
+# lo que ocurre y, al terminar, se obtiene un resumen en formato JSON con el tiempo de cada
+# etapa (descarga, filtrado, construcción, rutas, ordenación, exportación) y los contadores.
+
+import contextlib
+import cProfile
+import json
+import logging
+import threading
+import time
+from services.configuracion import obtener_config
+
+logger = logging.getLogger(__name__)
+
+
+def configurar_logging(nivel=None):
+    """Configura el formato y el nivel de los mensajes de la aplicación (ej: 'DEBUG', 'INFO'; por defecto LOG_LEVEL)."""
+    nivel = nivel or obtener_config().log_level
+    logging.basicConfig(level=nivel.upper() if isinstance(nivel, str) else nivel,
+                        format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+
+class Metricas:
+    """
+    Registro de métricas seguro entre hilos.
+
+    Cada etapa acumula el número de veces que se ha ejecutado, el tiempo total y el
+    máximo; los contadores son enteros con nombre libre ('google.peticiones',
+    'cache.aciertos', ...). Los ganchos registrados con `registrar_gancho` reciben
+    (etapa, segundos) al terminar cada etapa, por ejemplo para enviar los tiempos a un
+    sistema de trazas externo.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._etapas = {}
+        self._contadores = {}
+        self._ganchos = []
+
+    def contar(self, nombre, cantidad=1):
+        """Suma `cantidad` al contador `nombre`."""
+        with self._lock:
+            self._contadores[nombre] = self._contadores.get(nombre, 0) + cantidad
+
+    def registrar_tiempo(self, etapa, segundos):
+        """Añade una ejecución de `segundos` a la etapa indicada."""
+        with self._lock:
+            datos = self._etapas.setdefault(etapa, {"veces": 0, "segundos": 0.0, "maximo": 0.0})
+            datos["veces"] += 1
+            datos["segundos"] += segundos
+            datos["maximo"] = max(datos["maximo"], segundos)
+            ganchos = list(self._ganchos)
+        for gancho in ganchos:
+            gancho(etapa, segundos)
+
+    @contextlib.contextmanager
+    def cronometro(self, etapa):
+        """Mide el tiempo del bloque `with` y lo suma a la etapa indicada."""
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            segundos = time.perf_counter() - inicio
+            self.registrar_tiempo(etapa, segundos)
+            logger.debug("Etapa %s: %.3f s", etapa, segundos)
+
+    def registrar_gancho(self, gancho):
+        """Registra una función gancho(etapa, segundos) que se llama al terminar cada etapa."""
+        with self._lock:
+            self._ganchos.append(gancho)
+
+    def reiniciar(self):
+        """Pone a cero las etapas y los contadores (los ganchos se mantienen)."""
+        with self._lock:
+            self._etapas.clear()
+            self._contadores.clear()
+
+    def resumen(self):
+        """
+        Devuelve las métricas acumuladas en un diccionario serializable a JSON.
+
+        Returns:
+            dict: {"etapas": {etapa: {"veces", "segundos", "maximo"}}, "contadores": {nombre: valor}}
+        """
+        with self._lock:
+            etapas = {etapa: {"veces": datos["veces"], "segundos": round(datos["segundos"], 4), "maximo": round(datos["maximo"], 4)}
+                      for etapa, datos in self._etapas.items()}
+            return {"etapas": etapas, "contadores": dict(sorted(self._contadores.items()))}
+
+    def guardar(self, ruta, **extra):
+        """Escribe el resumen en un fichero JSON, junto con los datos adicionales indicados."""
+        with open(ruta, "w", encoding="utf-8") as fichero:
+            json.dump({**self.resumen(), **extra}, fichero, ensure_ascii=False, indent=2)
+
+
+# Registro compartido por toda la aplicación
+_metricas = Metricas()
+
+
+def obtener_metricas() -> Metricas:
+    """Devuelve el registro de métricas compartido."""
+    return _metricas
+
+
+def contar(nombre, cantidad=1):
+    """Suma `cantidad` al contador `nombre` del registro compartido."""
+    _metricas.contar(nombre, cantidad)
+
+
+def cronometro(etapa):
+    """Cronómetro de una etapa en el registro compartido (para usar con `with`)."""
+    return _metricas.cronometro(etapa)
+
+
+@contextlib.contextmanager
+def perfilar(ruta=None):
+    """
+    Ejecuta el bloque `with` bajo cProfile y guarda las estadísticas en `ruta`
+    (se pueden abrir con `python -m pstats ruta` o snakeviz). Sin ruta no hace nada.
+    """
+    if not ruta:
+        yield
+        return
+    perfil = cProfile.Profile()
+    perfil.enable()
+    try:
+        yield
+    finally:
+        perfil.disable()
+        perfil.dump_stats(ruta)
+        logger.info("Perfil de ejecución guardado en '%s'", ruta)
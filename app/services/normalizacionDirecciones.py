@@ -0,0 +1,150 @@
+# Normalización de las direcciones de destino antes de calcular las rutas.
+# Varios centros comparten edificio o tienen la misma dirección escrita de otra forma
+# ("C/ San Miguel, s/n" y "Calle San Miguel s/n"). Las direcciones se reducen a una forma
+# canónica (abreviaturas desarrolladas, "s/n" unificado, sin tildes, signos ni espacios
+# sobrantes) y los destinos con la misma forma canónica, o con las mismas coordenadas, se
+# consultan a Google Maps una sola vez. La forma canónica es también la clave de la caché.
+
+import math
+import re
+import unicodedata
+from functools import lru_cache
+
+# Abreviaturas habituales en las direcciones del conjunto de datos de la Junta
+ABREVIATURAS = {
+    "avda": "avenida", "avd": "avenida", "av": "avenida",
+    "cl": "calle", "callej": "callejon",
+    "ctra": "carretera", "crta": "carretera",
+    "pza": "plaza", "plza": "plaza", "pl": "plaza",
+    "po": "paseo", "pso": "paseo", "ps": "paseo",
+    "urb": "urbanizacion", "bda": "barriada", "bo": "barrio",
+    "cno": "camino", "cmno": "camino", "glta": "glorieta", "rda": "ronda",
+    "pje": "pasaje", "psje": "pasaje", "trva": "travesia", "trav": "travesia",
+    "pol": "poligono", "pgno": "poligono", "prol": "prolongacion",
+    "ntra": "nuestra", "sra": "senora", "sta": "santa", "sto": "santo",
+    "dr": "doctor", "gral": "general", "pdo": "partido",
+}
+
+# Palabras que no distinguen una dirección de otra ("Avda. de la Constitución" = "Avenida Constitución")
+PALABRAS_VACIAS = {"de", "del", "la", "las", "el", "los"}
+
+# Coordenadas con 4 decimales: unos 10 metros, el mismo edificio
+DECIMALES_COORDENADAS = 4
+
+_PATRON_SIN_NUMERO = re.compile(r"\bs\s*[/.\-]?\s*n(?:o|um)?\b\.?|\bsin\s+num(?:ero)?\b")
+_PATRON_CALLE = re.compile(r"\bc\s*/\s*")
+_PATRON_APARTADO = re.compile(r"\b(?:apdo|apartado)(?:\s+(?:de\s+)?correos)?\W*\d+")
+# "nº 5" -> "5"; no toca la "n" del "s/n" que ya ha unificado _PATRON_SIN_NUMERO
+_PATRON_NUMERO = re.compile(r"(?<!/)\b(?:no|num|n)\s+(?=\d)")
+_PATRON_PALABRA = re.compile(r"s/n|[a-z0-9]+")
+# Origen o destino dado como "latitud,longitud": el signo y el punto decimal no se pueden perder
+_PATRON_COORDENADAS = re.compile(r"^\s*([+-]?\d+(?:\.\d+)?)\s*,\s*([+-]?\d+(?:\.\d+)?)\s*$")
+
+
+# Texto sin tildes, en minúsculas y sin espacios en los extremos
+def normalizar_texto(texto) -> str:
+    """
+    Quita tildes, mayúsculas y espacios sobrantes de los extremos, para comparar textos
+    escritos de distinta forma (también los filtros de provincia y tipo del almacén de centros).
+
+    Example:
+        >>> normalizar_texto(" Almería ")
+        'almeria'
+    """
+    texto = unicodedata.normalize("NFKD", str(texto).strip().lower())
+    return "".join(caracter for caracter in texto if not unicodedata.combining(caracter))
+
+
+# Forma canónica de una dirección (memorizada: el origen y los destinos se normalizan en cada consulta a la caché)
+@lru_cache(maxsize=65536)
+def normalizar_direccion(texto: str) -> str:
+    """
+    Reduce una dirección a una forma canónica para comparar variantes de la misma.
+
+    Quita tildes y mayúsculas, desarrolla las abreviaturas de tipo de vía ("C/", "Avda.",
+    "Ctra."...), unifica las formas de "sin número" en "s/n", elimina el "nº" delante de
+    los números, los apartados de correos, los artículos y las preposiciones "de"/"del",
+    y deja las palabras separadas por un único espacio, sin comas ni puntos.
+
+    Las coordenadas ("37.1,-3.5") se dejan tal cual, solo sin espacios, para que no se
+    confundan puntos con distinto signo o distintos decimales.
+
+    Args:
+        texto (str): Dirección tal y como se envía a Google Maps
+
+    Returns:
+        str: Dirección canónica (solo sirve para comparar; a Google se le envía la original)
+
+    Example:
+        >>> normalizar_direccion("C/ San Miguel, s/n,18001, Granada")
+        'calle san miguel s/n 18001 granada'
+        >>> normalizar_direccion("Calle  San Miguel S/N, 18001, Granada")
+        'calle san miguel s/n 18001 granada'
+        >>> normalizar_direccion("Calle Mayor s/n 18001 Granada")
+        'calle mayor s/n 18001 granada'
+        >>> normalizar_direccion(" 37.1, -3.5")
+        '37.1,-3.5'
+    """
+    coordenadas = _PATRON_COORDENADAS.match(str(texto))
+    if coordenadas:
+        return f"{coordenadas.group(1)},{coordenadas.group(2)}"
+
+    texto = normalizar_texto(texto)
+    texto = _PATRON_SIN_NUMERO.sub(" s/n ", texto)
+    texto = _PATRON_CALLE.sub("calle ", texto)
+    texto = _PATRON_APARTADO.sub(" ", texto)
+    palabras = [ABREVIATURAS.get(palabra, palabra) for palabra in _PATRON_PALABRA.findall(_PATRON_NUMERO.sub(" ", texto))]
+    return " ".join(palabra for palabra in palabras if palabra not in PALABRAS_VACIAS)
+
+
+# Clave con la que se agrupan los destinos que comparten ruta
+def clave_destino(direccion: str, latitud=None, longitud=None) -> str:
+    """
+    Devuelve la clave de agrupación de un destino: sus coordenadas redondeadas si se
+    conocen (centro geocodificado) y, si no, su dirección canónica.
+
+    Args:
+        direccion (str): Dirección de destino
+        latitud (float): Latitud del destino (None o NaN si no se conoce)
+        longitud (float): Longitud del destino (None o NaN si no se conoce)
+
+    Returns:
+        str: Clave del destino
+    """
+    if latitud is not None and longitud is not None and not (math.isnan(latitud) or math.isnan(longitud)):
+        return f"geo:{round(latitud, DECIMALES_COORDENADAS)},{round(longitud, DECIMALES_COORDENADAS)}"
+    return normalizar_direccion(direccion)
+
+
+# Agrupar los destinos repetidos para consultar cada uno una sola vez
+def agrupar_destinos(direcciones: list, claves: list = None) -> tuple:
+    """
+    Agrupa los destinos que comparten clave, conservando el orden de primera aparición.
+
+    Args:
+        direcciones (list): Direcciones de destino
+        claves (list): Clave de agrupación de cada dirección (por defecto su forma canónica)
+
+    Returns:
+        tuple: (unicos, grupos)
+            - unicos (list): Dirección representante de cada grupo (la primera que aparece)
+            - grupos (list): Para cada representante, los índices de `direcciones` que comparten su ruta
+
+    Example:
+        >>> agrupar_destinos(["C/ Mayor, 1, Baza", "Calle Mayor 1, Baza", "Avda. Sol, 2, Baza"])
+        (['C/ Mayor, 1, Baza', 'Avda. Sol, 2, Baza'], [[0, 1], [2]])
+    """
+    if claves is None:
+        claves = [normalizar_direccion(direccion) for direccion in direcciones]
+
+    posiciones = {}
+    unicos, grupos = [], []
+    for indice, (direccion, clave) in enumerate(zip(direcciones, claves)):
+        posicion = posiciones.get(clave)
+        if posicion is None:
+            posiciones[clave] = len(unicos)
+            unicos.append(direccion)
+            grupos.append([indice])
+        else:
+            grupos[posicion].append(indice)
+    return unicos, grupos
@@ -0,0 +1,167 @@
+# Copia local (SQLite) del conjunto de datos de centros de la Junta de Andalucía.
+# Permite responder las consultas sin volver a descargar el listado completo en cada
+# llamada y trabajar en modo sin conexión a partir de la última copia descargada.
+
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from services.configuracion import obtener_config
+
+
+# Huella de un registro para detectar si ha cambiado entre dos descargas
+def hash_registro(registro: dict) -> str:
+    return hashlib.sha1(json.dumps(registro, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+class SnapshotJunta:
+    """
+    Almacén local de los registros de `datastore_search`.
+
+    Cada registro se guarda junto con una huella de su contenido, de modo que al
+    sincronizar solo se escriben las filas nuevas o modificadas y se eliminan las que
+    ya no aparecen. También guarda la versión del recurso (fecha de última modificación
+    que informa el portal) y el momento de la última comprobación.
+
+    Args:
+        ruta (str): Ruta del fichero SQLite (':memory:' para un almacén temporal; por defecto JUNTA_SNAPSHOT_PATH)
+    """
+
+    def __init__(self, ruta=None):
+        ruta = ruta or obtener_config().junta_snapshot_path
+        self.ruta = ruta
+        self._lock = threading.Lock()
+        self._conexion = sqlite3.connect(ruta, check_same_thread=False)
+        self._conexion.execute(
+            "CREATE TABLE IF NOT EXISTS registros ("
+            " codigo TEXT PRIMARY KEY,"
+            " orden INTEGER NOT NULL,"
+            " hash TEXT NOT NULL,"
+            " datos TEXT NOT NULL)"
+        )
+        self._conexion.execute("CREATE TABLE IF NOT EXISTS meta (clave TEXT PRIMARY KEY, valor TEXT)")
+        self._conexion.commit()
+
+    def _leer_meta(self, clave):
+        fila = self._conexion.execute("SELECT valor FROM meta WHERE clave = ?", (clave,)).fetchone()
+        return fila[0] if fila else None
+
+    def _escribir_meta(self, clave, valor):
+        self._conexion.execute("INSERT OR REPLACE INTO meta (clave, valor) VALUES (?, ?)", (clave, valor))
+
+    def version(self):
+        """Devuelve la versión del recurso con la que se sincronizó la copia (o None)."""
+        with self._lock:
+            return self._leer_meta("version")
+
+    def segundos_desde_comprobacion(self):
+        """Segundos transcurridos desde la última vez que se comprobó la versión en el portal."""
+        with self._lock:
+            comprobado = self._leer_meta("comprobado")
+        return time.time() - float(comprobado) if comprobado else float("inf")
+
+    def marcar_comprobado(self):
+        """Registra que la copia se acaba de comprobar contra el portal y sigue vigente."""
+        with self._lock:
+            self._escribir_meta("comprobado", str(time.time()))
+            self._conexion.commit()
+
+    def cerrar(self):
+        """Cierra la conexión con la base de datos."""
+        with self._lock:
+            self._conexion.close()
+
+    def vacio(self):
+        """Indica si todavía no se ha descargado ningún registro."""
+        with self._lock:
+            return self._conexion.execute("SELECT 1 FROM registros LIMIT 1").fetchone() is None
+
+    def sincronizar(self, registros, version=None):
+        """
+        Sincroniza la copia local con los registros descargados.
+
+        Solo se escriben los registros nuevos o con contenido distinto y se eliminan los
+        que ya no vienen en la descarga. Si la descarga falla a mitad (el iterable lanza
+        una excepción), se deshacen los cambios y la copia anterior queda intacta.
+
+        Args:
+            registros (iterable): Registros completos del conjunto de datos
+            version (str): Versión del recurso a la que corresponden los registros
+
+        Returns:
+            dict: Número de registros nuevos, modificados, eliminados y sin cambios
+        """
+        estadisticas = {"nuevos": 0, "modificados": 0, "eliminados": 0, "sin_cambios": 0}
+        with self._lock:
+            hashes = dict(self._conexion.execute("SELECT codigo, hash FROM registros"))
+            vistos = set()
+            try:
+                for orden, registro in enumerate(registros):
+                    codigo = str(registro.get("codigo") or registro.get("_id"))
+                    huella = hash_registro(registro)
+                    vistos.add(codigo)
+                    anterior = hashes.get(codigo)
+                    if anterior == huella:
+                        estadisticas["sin_cambios"] += 1
+                        self._conexion.execute("UPDATE registros SET orden = ? WHERE codigo = ?", (orden, codigo))
+                        continue
+                    estadisticas["nuevos" if anterior is None else "modificados"] += 1
+                    self._conexion.execute(
+                        "INSERT OR REPLACE INTO registros (codigo, orden, hash, datos) VALUES (?, ?, ?, ?)",
+                        (codigo, orden, huella, json.dumps(registro, ensure_ascii=False)),
+                    )
+
+                eliminados = [(codigo,) for codigo in hashes if codigo not in vistos]
+                self._conexion.executemany("DELETE FROM registros WHERE codigo = ?", eliminados)
+                estadisticas["eliminados"] = len(eliminados)
+
+                if version is not None:
+                    self._escribir_meta("version", version)
+                self._escribir_meta("comprobado", str(time.time()))
+                self._conexion.commit()
+            except Exception:
+                self._conexion.rollback()
+                raise
+        return estadisticas
+
+    def registros(self, filtros=None):
+        """
+        Generador con los registros guardados, en el mismo orden en que los devolvió la API.
+
+        Args:
+            filtros (dict): Filtros exactos campo -> valor, con la misma forma que el
+                            parámetro `filters` de `datastore_search`
+
+        Yields:
+            dict: Un registro de centro
+        """
+        consulta = "SELECT datos FROM registros"
+        valores = []
+        if filtros:
+            condiciones = []
+            for campo, valor in filtros.items():
+                condiciones.append(f"json_extract(datos, '$.\"{campo}\"') = ?")
+                valores.append(valor)
+            consulta += " WHERE " + " AND ".join(condiciones)
+        consulta += " ORDER BY orden"
+
+        with self._lock:
+            filas = self._conexion.execute(consulta, valores).fetchall()
+        for (datos,) in filas:
+            yield json.loads(datos)
+
+
+# Instancia compartida, creada la primera vez que se necesita
+_snapshot = None
+_snapshot_lock = threading.Lock()
+
+
+def obtener_snapshot() -> SnapshotJunta:
+    """Devuelve la copia local compartida, creándola si no existe."""
+    global _snapshot
+    if _snapshot is None:
+        with _snapshot_lock:
+            if _snapshot is None:
+                _snapshot = SnapshotJunta()
+    return _snapshot
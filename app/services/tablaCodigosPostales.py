@@ -0,0 +1,335 @@
+# Tabla precalculada de tiempos de viaje desde cada código postal hasta cada instituto.
+# Las filas son los códigos postales del conjunto de datos (su centroide como origen) y las
+# columnas los IES; se guarda como arrays de NumPy que se abren con memoria mapeada, de modo
+# que ordenar los centros desde un código postal conocido es una búsqueda y un argsort, sin
+# ninguna consulta a Google Maps. La tabla se actualiza de forma incremental: al aparecer
+# centros o códigos postales nuevos solo se calculan sus columnas o filas (y las celdas que
+# quedaron sin ruta); los códigos postales ya calculados se conservan mientras sigan en el
+# conjunto de datos o hasta que se eliminen con --eliminar.
+#
+# Precalcular o actualizar la tabla (desde la carpeta app/):
+#     python -m services.tablaCodigosPostales --max-codigos 300
+
+import argparse
+import json
+import logging
+import os
+import re
+import threading
+import time
+
+import numpy as np
+
+from services.configuracion import obtener_config
+from services.googleConnect import calcular_matriz_distancias
+from services.metricas import configurar_logging
+
+logger = logging.getLogger(__name__)
+
+# Código postal español (5 cifras) dentro de una dirección
+_PATRON_CODIGO_POSTAL = re.compile(r"(?<!\d)(\d{5})(?!\d)")
+
+
+def codigo_postal_de(direccion: str):
+    """Devuelve el código postal que aparece en la dirección, o None si no tiene."""
+    coincidencia = _PATRON_CODIGO_POSTAL.search(direccion or "")
+    return coincidencia.group(1) if coincidencia else None
+
+
+def normalizar_codigo_postal(codigo_postal) -> str:
+    """
+    Código postal con sus 5 cifras: la API de la Junta lo devuelve como número, así que los
+    de Almería (04xxx) llegan sin el cero inicial ('4700' o '4700.0' -> '04700').
+    """
+    texto = str(codigo_postal).strip()
+    if texto.endswith(".0"):
+        texto = texto[:-2]
+    return texto.zfill(5)
+
+
+def origen_codigo_postal(codigo_postal, provincia):
+    """Dirección que se usa como origen para el centroide de un código postal."""
+    return f"{codigo_postal}, {provincia}, España"
+
+
+class TablaCodigosPostales:
+    """
+    Tiempos y distancias por carretera desde el centroide de cada código postal hasta cada IES.
+
+    En el directorio se guardan `minutos.npy` y `km.npy` (float32, códigos postales x centros,
+    NaN si no se pudo calcular) y `indice.json` con el orden de filas y columnas. Los arrays
+    se abren con memoria mapeada, así que cargar la tabla no lee los datos del disco hasta
+    que se consulta una fila.
+
+    Args:
+        directorio (str): Carpeta de la tabla (por defecto TABLA_CP_DIR)
+    """
+
+    def __init__(self, directorio=None):
+        self.directorio = directorio or obtener_config().tabla_cp_dir
+        self.codigos_postales = []
+        self.origenes = []
+        self.codigos_centros = []
+        self.minutos = np.empty((0, 0), dtype=np.float32)
+        self.km = np.empty((0, 0), dtype=np.float32)
+        self.actualizado = None
+        self._cargar()
+
+    def _ruta(self, nombre):
+        return os.path.join(self.directorio, nombre)
+
+    def _cargar(self):
+        if not os.path.exists(self._ruta("indice.json")):
+            self._indexar()
+            return
+        with open(self._ruta("indice.json"), encoding="utf-8") as fichero:
+            indice = json.load(fichero)
+        self.codigos_postales = indice["codigos_postales"]
+        self.origenes = indice["origenes"]
+        self.codigos_centros = indice["codigos_centros"]
+        self.actualizado = indice.get("actualizado")
+        self.minutos = np.load(self._ruta("minutos.npy"), mmap_mode="r")
+        self.km = np.load(self._ruta("km.npy"), mmap_mode="r")
+        self._indexar()
+
+    def _indexar(self):
+        self._filas = {codigo: i for i, codigo in enumerate(self.codigos_postales)}
+        self._columnas = {codigo: j for j, codigo in enumerate(self.codigos_centros)}
+
+    def __contains__(self, codigo_postal):
+        return normalizar_codigo_postal(codigo_postal) in self._filas
+
+    def __len__(self):
+        return len(self.codigos_postales)
+
+    def consultar(self, codigo_postal, codigos_centros):
+        """
+        Devuelve los minutos y kilómetros desde un código postal hasta los centros indicados.
+
+        Args:
+            codigo_postal (str): Código postal de origen (debe estar en la tabla)
+            codigos_centros (list): Códigos de los centros, en el orden deseado
+
+        Returns:
+            tuple: (minutos, km) - arrays float alineados con `codigos_centros`
+                   (NaN para los centros que no están en la tabla o sin ruta)
+        """
+        fila = self._filas[normalizar_codigo_postal(codigo_postal)]
+        columnas = np.array([self._columnas.get(str(codigo), -1) for codigo in codigos_centros], dtype=np.intp)
+        conocidas = columnas >= 0
+        minutos = np.full(len(columnas), np.nan)
+        km = np.full(len(columnas), np.nan)
+        minutos[conocidas] = self.minutos[fila, columnas[conocidas]]
+        km[conocidas] = self.km[fila, columnas[conocidas]]
+        return minutos, km
+
+    def actualizar(self, origenes, destinos, eliminar=()):
+        """
+        Actualiza la tabla calculando solo las filas, columnas y celdas que faltan.
+
+        Los códigos postales de `origenes` se añaden a los que ya tiene la tabla, que se
+        conservan con sus valores salvo los indicados en `eliminar`. Las columnas pasan a ser
+        los centros de `destinos` (los que ya no aparecen se eliminan). Se calculan, con
+        peticiones de varios orígenes y destinos a Distance Matrix (apoyadas en la caché de
+        rutas), las filas y columnas nuevas y las celdas que quedaron sin ruta (NaN) en una
+        actualización anterior.
+
+        Args:
+            origenes (dict): Código postal -> dirección de origen de su centroide
+            destinos (dict): Código de centro -> dirección de destino del centro
+            eliminar (iterable): Códigos postales a quitar de la tabla
+
+        Returns:
+            dict: Filas y columnas nuevas, eliminadas, celdas recalculadas y pares calculados
+        """
+        eliminar = {normalizar_codigo_postal(codigo) for codigo in eliminar}
+        direcciones = dict(zip(self.codigos_postales, self.origenes))
+        direcciones.update((normalizar_codigo_postal(codigo), direccion) for codigo, direccion in origenes.items())
+        codigos_postales = sorted(codigo for codigo in direcciones if codigo not in eliminar)
+        codigos_centros = [str(codigo) for codigo in destinos]
+        filas_viejas = np.array([self._filas.get(codigo, -1) for codigo in codigos_postales], dtype=np.intp)
+        columnas_viejas = np.array([self._columnas.get(codigo, -1) for codigo in codigos_centros], dtype=np.intp)
+
+        minutos = np.full((len(codigos_postales), len(codigos_centros)), np.nan, dtype=np.float32)
+        km = np.full_like(minutos, np.nan)
+
+        # Copiar el bloque ya calculado (filas y columnas que siguen existiendo)
+        filas_conservadas = np.flatnonzero(filas_viejas >= 0)
+        columnas_conservadas = np.flatnonzero(columnas_viejas >= 0)
+        if len(filas_conservadas) and len(columnas_conservadas):
+            bloque = np.ix_(filas_viejas[filas_conservadas], columnas_viejas[columnas_conservadas])
+            destino = np.ix_(filas_conservadas, columnas_conservadas)
+            minutos[destino] = self.minutos[bloque]
+            km[destino] = self.km[bloque]
+
+        filas_nuevas = np.flatnonzero(filas_viejas < 0)
+        columnas_nuevas = np.flatnonzero(columnas_viejas < 0)
+        direcciones_origen = [direcciones[codigo] for codigo in codigos_postales]
+        direcciones_destino = list(destinos.values())
+        calculados = 0
+
+        def calcular(filas, columnas):
+            nonlocal calculados
+            if not len(filas) or not len(columnas):
+                return
+            resultados, _ = calcular_matriz_distancias([direcciones_origen[i] for i in filas],
+                                                       [direcciones_destino[j] for j in columnas])
+            for i, fila in zip(filas, resultados):
+                for j, resultado in zip(columnas, fila):
+                    if resultado:
+                        minutos[i, j] = resultado["duracion en s"] / 60
+                        km[i, j] = resultado["distancia en m"] / 1000
+            calculados += len(filas) * len(columnas)
+
+        # Celdas del bloque conservado que quedaron sin ruta: se vuelven a pedir, fila a fila,
+        # solo las que faltan (antes de calcular las nuevas, que también pueden quedar en NaN)
+        recalculadas = 0
+        for i in filas_conservadas:
+            columnas_sin_ruta = columnas_conservadas[np.isnan(minutos[i, columnas_conservadas])]
+            calcular([i], columnas_sin_ruta)
+            recalculadas += len(columnas_sin_ruta)
+
+        # Centros nuevos desde los códigos postales existentes y códigos postales nuevos hasta todos los centros
+        calcular(filas_conservadas, columnas_nuevas)
+        calcular(filas_nuevas, np.arange(len(codigos_centros)))
+
+        estadisticas = {
+            "codigos_postales_nuevos": len(filas_nuevas),
+            "centros_nuevos": len(columnas_nuevas),
+            "codigos_postales_eliminados": len(set(self.codigos_postales) - set(codigos_postales)),
+            "centros_eliminados": len(set(self.codigos_centros) - set(codigos_centros)),
+            "celdas_recalculadas": recalculadas,
+            "celdas_sin_ruta": int(np.isnan(minutos).sum()),
+            "pares_calculados": calculados,
+        }
+        self.codigos_postales = codigos_postales
+        self.origenes = direcciones_origen
+        self.codigos_centros = codigos_centros
+        self.minutos, self.km = minutos, km
+        self.actualizado = time.strftime("%Y-%m-%d %H:%M:%S")
+        self._indexar()
+        self.guardar()
+        return estadisticas
+
+    def guardar(self):
+        """Escribe la tabla en el directorio, sustituyendo los ficheros de golpe al terminar."""
+        os.makedirs(self.directorio, exist_ok=True)
+        for nombre, datos in (("minutos.npy", self.minutos), ("km.npy", self.km)):
+            temporal = self._ruta(f"{nombre}.tmp")
+            with open(temporal, "wb") as fichero:
+                np.save(fichero, np.asarray(datos, dtype=np.float32))
+            os.replace(temporal, self._ruta(nombre))
+        indice = {"codigos_postales": self.codigos_postales, "origenes": self.origenes,
+                  "codigos_centros": self.codigos_centros, "actualizado": self.actualizado}
+        temporal = self._ruta("indice.json.tmp")
+        with open(temporal, "w", encoding="utf-8") as fichero:
+            json.dump(indice, fichero, ensure_ascii=False)
+        os.replace(temporal, self._ruta("indice.json"))
+        # Volver a abrir los arrays recién escritos con memoria mapeada
+        self._cargar()
+
+
+# Ordenar los centros desde el código postal de la dirección de origen, sin consultar a Google Maps
+def ordenar_por_tabla(direccion_origen: str, centros: list, tabla=None):
+    """
+    Ordena los centros por el tiempo precalculado desde el código postal de `direccion_origen`.
+
+    Rellena `duracion_estimada_min` y `distancia_estimada_km` de cada centro con los valores
+    de la tabla. Los centros que no están en la tabla quedan al final, en su orden original.
+
+    Args:
+        direccion_origen (str): Dirección de origen; debe contener un código postal
+        centros (list): Lista de objetos CentroEducativo
+        tabla (TablaCodigosPostales): Tabla a usar (por defecto, la compartida)
+
+    Returns:
+        list: Centros ordenados, o None si el código postal no está en la tabla
+
+    Example:
+        >>> ordenados = ordenar_por_tabla("Calle Costa Rica 49, 18194, Churriana de la Vega, Granada", centros)
+        >>> ordenados[0].duracion_estimada_min
+        5.3
+    """
+    tabla = tabla or obtener_tabla()
+    codigo_postal = codigo_postal_de(direccion_origen)
+    if codigo_postal is None or codigo_postal not in tabla:
+        return None
+
+    minutos, km = tabla.consultar(codigo_postal, [centro.codigo_centro for centro in centros])
+    orden = np.argsort(minutos, kind="stable")  # Los NaN (sin dato) quedan al final
+    for i in np.flatnonzero(~np.isnan(minutos)):
+        centros[i].duracion_estimada_min = round(float(minutos[i]), 1)
+        centros[i].distancia_estimada_km = round(float(km[i]), 1)
+    return [centros[i] for i in orden]
+
+
+# Instancia compartida, cargada la primera vez que se necesita
+_tabla = None
+_tabla_lock = threading.Lock()
+
+
+def obtener_tabla(recargar=False) -> TablaCodigosPostales:
+    """Devuelve la tabla compartida, abriéndola del disco la primera vez (o si se pide recargar)."""
+    global _tabla
+    if _tabla is None or recargar:
+        with _tabla_lock:
+            if _tabla is None or recargar:
+                _tabla = TablaCodigosPostales()
+    return _tabla
+
+
+def precalcular_tabla(max_codigos=None, codigos_postales=None, eliminar=None):
+    """
+    Crea o actualiza la tabla con los códigos postales del conjunto de datos y todos los IES.
+
+    Los códigos postales seleccionados se añaden a los que ya tiene la tabla; solo se quitan
+    los indicados en `eliminar` y los que ya no aparecen en el conjunto de datos.
+
+    Args:
+        max_codigos (int): Añadir solo los `max_codigos` códigos postales con más centros
+        codigos_postales (list): Códigos postales concretos a añadir (en lugar de los del conjunto de datos)
+        eliminar (list): Códigos postales a quitar de la tabla (si no se indica nada más, no se añade ninguno)
+
+    Returns:
+        dict: Estadísticas de `TablaCodigosPostales.actualizar`
+    """
+    # Importación local: el listado de la Junta solo se necesita al precalcular
+    from services.ConexionJuntaPandas import obtener_dataframe_centros, consulta_todos_centros
+    from models.ColeccionCentros import ColeccionCentros
+
+    df = obtener_dataframe_centros()
+    por_codigo = df.dropna(subset=["C_POSTAL"]).astype({"C_POSTAL": str})
+    # Recuperar el cero inicial que se pierde al leer el código postal como número
+    por_codigo["C_POSTAL"] = por_codigo["C_POSTAL"].map(normalizar_codigo_postal)
+    frecuencias = por_codigo["C_POSTAL"].value_counts()
+    if codigos_postales:
+        frecuencias = frecuencias[frecuencias.index.isin([normalizar_codigo_postal(codigo) for codigo in codigos_postales])]
+    if max_codigos:
+        frecuencias = frecuencias.head(max_codigos)
+    if eliminar and codigos_postales is None and not max_codigos:
+        # Solo se piden eliminaciones: no se añade ningún código postal
+        frecuencias = frecuencias.iloc[:0]
+
+    # Provincia más frecuente de cada código postal, para situar su centroide
+    provincias = por_codigo.groupby("C_POSTAL", observed=True)["D_PROVINCIA"].agg(lambda valores: valores.astype(str).mode().iat[0])
+    origenes = {codigo: origen_codigo_postal(codigo, provincias[codigo]) for codigo in sorted(frecuencias.index)}
+
+    coleccion = ColeccionCentros.desde_dataframe(consulta_todos_centros())
+    destinos = dict(zip((str(codigo) for codigo in coleccion.columnas["codigo_centro"]), coleccion.direcciones_destino()))
+
+    tabla = obtener_tabla()
+    desaparecidos = set(tabla.codigos_postales) - set(provincias.index)
+    estadisticas = tabla.actualizar(origenes, destinos, desaparecidos.union(eliminar or ()))
+    logger.info("Tabla de códigos postales actualizada en '%s': %s", tabla.directorio, estadisticas)
+    return estadisticas
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Precalcula la tabla de tiempos desde cada código postal hasta cada IES.")
+    parser.add_argument("--max-codigos", type=int, default=None, help="Número máximo de códigos postales (los que tienen más centros)")
+    parser.add_argument("--codigos", nargs="*", default=None, help="Códigos postales concretos a añadir")
+    parser.add_argument("--eliminar", nargs="*", default=None, help="Códigos postales a quitar de la tabla")
+    argumentos = parser.parse_args()
+
+    configurar_logging()
+    precalcular_tabla(argumentos.max_codigos, argumentos.codigos, argumentos.eliminar)
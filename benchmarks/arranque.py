@@ -0,0 +1,115 @@
+"""
+Benchmark del tiempo de arranque en frío: cada repetición se ejecuta en un proceso nuevo de
+Python, de modo que se mide lo que tarda de verdad la línea de comandos o un worker en
+estar listo (importaciones incluidas), sin la caché de módulos de ejecuciones anteriores.
+
+Escenarios:
+    - importar: `import main` (lo que paga cualquier script o worker que use la aplicación)
+    - cli: `python app/main.py --help` (arranque de la línea de comandos hasta leer los argumentos)
+    - app: `import main; main.app` (creación de la aplicación FastAPI, lo que tarda un worker
+      del servidor en importar la aplicación; pandas y NumPy se cargan con la primera petición)
+
+Termina con código 1 si la mediana de algún escenario supera `--limite` segundos,
+para poder usarlo como comprobación en integración continua.
+
+Uso:
+    python benchmarks/arranque.py --repeticiones 10 --importtime
+"""
+
+import argparse
+import os
+import re
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+DIRECTORIO = os.path.dirname(os.path.abspath(__file__))
+RAIZ = os.path.dirname(DIRECTORIO)
+DIRECTORIO_APP = os.path.join(RAIZ, "app")
+
+# Escenario -> (argumentos de Python, si se le aplica el límite)
+ESCENARIOS = {
+    "importar": (["-c", "import main"], True),
+    "cli": ([os.path.join(DIRECTORIO_APP, "main.py"), "--help"], True),
+    "app": (["-c", "import main; main.app"], True),
+}
+
+# Módulos pesados que no deberían cargarse al importar la aplicación (ni al crearla, salvo FastAPI)
+MODULOS_PESADOS = ("pandas", "numpy", "googlemaps", "requests", "fastapi")
+
+
+def ejecutar(argumentos_python, importtime=False):
+    """Ejecuta Python en un proceso nuevo desde app/ y devuelve (segundos, stderr)."""
+    comando = [sys.executable, *(["-X", "importtime"] if importtime else []), *argumentos_python]
+    inicio = time.perf_counter()
+    proceso = subprocess.run(comando, cwd=DIRECTORIO_APP, capture_output=True, text=True)
+    segundos = time.perf_counter() - inicio
+    if proceso.returncode != 0:
+        raise RuntimeError(f"Falló '{' '.join(argumentos_python)}':\n{proceso.stderr}")
+    return segundos, proceso.stderr
+
+
+def modulos_cargados(crear_app=False):
+    """Devuelve los módulos pesados que quedan cargados tras `import main` (y `main.app` si se pide)."""
+    codigo = f"import main, sys; {'main.app; ' if crear_app else ''}print(','.join(m for m in {MODULOS_PESADOS!r} if m in sys.modules))"
+    proceso = subprocess.run([sys.executable, "-c", codigo], cwd=DIRECTORIO_APP, capture_output=True, text=True)
+    return [modulo for modulo in proceso.stdout.strip().split(",") if modulo]
+
+
+def importaciones_mas_lentas(argumentos_python, cantidad):
+    """Módulos con más tiempo acumulado (incluidas sus dependencias) según `python -X importtime`."""
+    _, salida = ejecutar(argumentos_python, importtime=True)
+    tiempos = []
+    for linea in salida.splitlines():
+        coincidencia = re.match(r"import time:\s+\d+ \|\s+(\d+) \|\s*(\S+)", linea)
+        if coincidencia:
+            tiempos.append((int(coincidencia.group(1)), coincidencia.group(2)))
+    return sorted(tiempos, reverse=True)[:cantidad]
+
+
+def medir(escenarios, repeticiones):
+    resumen = {}
+    for nombre in escenarios:
+        argumentos_python, con_limite = ESCENARIOS[nombre]
+        segundos = np.array([ejecutar(argumentos_python)[0] for _ in range(repeticiones)])
+        resumen[nombre] = {
+            "p50_ms": round(float(np.percentile(segundos, 50)) * 1000, 1),
+            "max_ms": round(float(segundos.max()) * 1000, 1),
+            "con_limite": con_limite,
+        }
+    return resumen
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Tiempo de arranque en frío de la aplicación y de la línea de comandos.")
+    parser.add_argument("--repeticiones", type=int, default=5, help="Procesos nuevos lanzados por escenario")
+    parser.add_argument("--escenarios", nargs="+", choices=list(ESCENARIOS), default=list(ESCENARIOS))
+    parser.add_argument("--limite", type=float, default=1.0, help="Segundos máximos (mediana) de los escenarios con límite")
+    parser.add_argument("--importtime", action="store_true", help="Mostrar las importaciones más lentas de cada escenario")
+    argumentos = parser.parse_args()
+
+    resumen = medir(argumentos.escenarios, argumentos.repeticiones)
+    print(f"{'Escenario':<12}{'p50 (ms)':>10}{'máx (ms)':>10}  Límite")
+    superados = []
+    for nombre, datos in resumen.items():
+        limite = f"{argumentos.limite * 1000:.0f} ms" if datos["con_limite"] else "-"
+        if datos["con_limite"] and datos["p50_ms"] > argumentos.limite * 1000:
+            superados.append(nombre)
+            limite += " (superado)"
+        print(f"{nombre:<12}{datos['p50_ms']:>10.1f}{datos['max_ms']:>10.1f}  {limite}")
+
+    pesados = modulos_cargados()
+    print(f"\nMódulos pesados cargados por 'import main': {', '.join(pesados) or 'ninguno'}")
+    pesados = modulos_cargados(crear_app=True)
+    print(f"Módulos pesados cargados por 'main.app': {', '.join(pesados) or 'ninguno'}")
+
+    if argumentos.importtime:
+        for nombre in argumentos.escenarios:
+            print(f"\nImportaciones más lentas ({nombre}):")
+            for microsegundos, modulo in importaciones_mas_lentas(ESCENARIOS[nombre][0], 10):
+                print(f"  {microsegundos / 1000:>8.1f} ms  {modulo}")
+
+    if superados:
+        sys.exit(1)
@@ -0,0 +1,191 @@
+"""
+Benchmark de extremo a extremo con las APIs de la Junta y de Google Maps sustituidas por un
+servidor local (servidorFalso.py), de modo que los cambios de rendimiento se pueden comparar
+sin conexión, sin gastar cuota y con resultados repetibles.
+
+Mide, para cada fase, la latencia p50/p99 de las repeticiones, el número de centros por
+segundo y las llamadas a cada API por ejecución:
+    - carga: descarga paginada de datastore_search y construcción del DataFrame
+    - filtrado: consultas de ConexionJuntaPandas sobre el DataFrame ya cargado
+    - rutas: cálculo por lotes con la caché de rutas (SQLite en disco) vacía
+    - rutas_cache: el mismo cálculo con la caché ya llena
+    - exportar: ordenación por duración y escritura del CSV
+    - extremo_a_extremo: creacion_csv_bil completo (carga, rutas, salida por consola y CSV)
+
+Uso:
+    python benchmarks/benchmark.py --copias 20 --latencia-google 0.05 --json resultados.json
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+DIRECTORIO = os.path.dirname(os.path.abspath(__file__))
+RAIZ = os.path.dirname(DIRECTORIO)
+FIXTURE_POR_DEFECTO = os.path.join(RAIZ, "2024 11 de noviembre.csv")
+ORIGEN_POR_DEFECTO = "Calle Costa Rica 49, 18194, Churriana de la Vega, Granada"
+
+sys.path.insert(0, DIRECTORIO)
+from servidorFalso import ServidorFalso, cargar_registros
+
+
+def configurar_entorno(url_base, directorio, qps):
+    # La configuración se lee la primera vez que se usa, así que las variables se fijan antes
+    os.environ["JUNTA_API_BASE"] = f"{url_base}/api/3/action"
+    os.environ["GOOGLE_MAPS_BASE_URL"] = url_base
+    os.environ["GOOGLE_MAPS_API_KEY"] = "AIzaBenchmarkClaveFalsaParaServidorLocal"
+    os.environ["GOOGLE_MAPS_QPS"] = str(qps)
+    os.environ["JUNTA_SNAPSHOT"] = "0"
+    os.environ["CACHE_GOOGLE_PATH"] = os.path.join(directorio, "cache_google.sqlite")
+    os.environ["CHECKPOINT_TRABAJO_PATH"] = os.path.join(directorio, "trabajo_centros.json")
+    sys.path.insert(0, os.path.join(RAIZ, "app"))
+
+
+class Medidor:
+    """Acumula las repeticiones de cada fase y las llamadas a las APIs que hace cada una."""
+
+    def __init__(self, servidor):
+        self.servidor = servidor
+        self.fases = {}
+
+    @contextlib.contextmanager
+    def medir(self, fase, elementos):
+        antes = dict(self.servidor.contadores)
+        inicio = time.perf_counter()
+        yield
+        segundos = time.perf_counter() - inicio
+        llamadas = {nombre: valor - antes.get(nombre, 0) for nombre, valor in self.servidor.contadores.items()
+                    if valor != antes.get(nombre, 0)}
+        datos = self.fases.setdefault(fase, {"segundos": [], "elementos": elementos, "llamadas": []})
+        datos["segundos"].append(segundos)
+        datos["llamadas"].append(llamadas)
+
+    def resumen(self):
+        resumen = {}
+        for fase, datos in self.fases.items():
+            segundos = np.array(datos["segundos"])
+            nombres = sorted({nombre for llamadas in datos["llamadas"] for nombre in llamadas})
+            resumen[fase] = {
+                "repeticiones": len(segundos),
+                "elementos": datos["elementos"],
+                "p50_ms": round(float(np.percentile(segundos, 50)) * 1000, 2),
+                "p99_ms": round(float(np.percentile(segundos, 99)) * 1000, 2),
+                "media_ms": round(float(segundos.mean()) * 1000, 2),
+                "centros_por_s": round(datos["elementos"] / float(np.median(segundos)), 1) if datos["elementos"] else None,
+                "llamadas_por_ejecucion": {nombre: sum(llamadas.get(nombre, 0) for llamadas in datos["llamadas"]) / len(segundos)
+                                           for nombre in nombres},
+            }
+        return resumen
+
+
+def ejecutar(argumentos):
+    registros = cargar_registros(argumentos.fixture, argumentos.copias)
+    servidor = ServidorFalso(registros, argumentos.latencia_google, argumentos.latencia_junta,
+                             argumentos.tasa_errores, argumentos.tasa_errores_http)
+    url_base = servidor.iniciar()
+    directorio = tempfile.mkdtemp(prefix="benchmark_centros_")
+    configurar_entorno(url_base, directorio, argumentos.qps)
+
+    # Importar la aplicación ya con el entorno apuntando al servidor local
+    import services.ConexionJuntaPandas as junta
+    import services.cacheRutas as cache_rutas
+    from models.CentroEducativo import CentroEducativo
+    from models.ColeccionCentros import ColeccionCentros
+    import main
+
+    # La caché es un fichero SQLite, como en la línea de comandos y en el servidor; se borra para empezar en frío
+    ruta_cache = os.environ["CACHE_GOOGLE_PATH"]
+
+    def cache_vacia():
+        if cache_rutas._cache is not None:
+            cache_rutas._cache.cerrar()
+        for sufijo in ("", "-wal", "-shm"):
+            if os.path.exists(ruta_cache + sufijo):
+                os.remove(ruta_cache + sufijo)
+        cache_rutas._cache = cache_rutas.CacheRutas(ruta_cache)
+
+    medidor = Medidor(servidor)
+    repeticiones = argumentos.repeticiones
+    try:
+        for _ in range(repeticiones):
+            junta._df_centros = None
+            with medidor.medir("carga", len(registros)):
+                df = junta.obtener_dataframe_centros()
+
+        ies = junta.consulta_todos_centros()
+        for _ in range(repeticiones):
+            with medidor.medir("filtrado", len(df)):
+                junta.consulta_todos_centros()
+                junta.consulta_todos_centros_bil()
+                junta.consulta_direccion_municipio_provincia("Granada")
+
+        for _ in range(argumentos.repeticiones_rutas):
+            cache_vacia()
+            coleccion = ColeccionCentros.desde_dataframe(ies)
+            with medidor.medir("rutas", len(coleccion)):
+                CentroEducativo.calcula_distancias_lote(coleccion.vistas(), argumentos.origen)
+
+        for _ in range(repeticiones):
+            coleccion = ColeccionCentros.desde_dataframe(ies)
+            with medidor.medir("rutas_cache", len(coleccion)):
+                CentroEducativo.calcula_distancias_lote(coleccion.vistas(), argumentos.origen)
+
+        ruta_csv = os.path.join(directorio, "exportado.csv")
+        for _ in range(repeticiones):
+            with medidor.medir("exportar", len(coleccion)):
+                coleccion.ordenar_por_duracion().a_dataframe().to_csv(ruta_csv, index=False, encoding="utf-8-sig")
+
+        # creacion_csv_bil escribe los CSV en el directorio actual y muestra cada centro por consola
+        directorio_actual = os.getcwd()
+        os.chdir(directorio)
+        try:
+            for _ in range(argumentos.repeticiones_rutas):
+                junta._df_centros = None
+                cache_vacia()
+                with medidor.medir("extremo_a_extremo", len(ies)), contextlib.redirect_stdout(io.StringIO()):
+                    main.creacion_csv_bil(argumentos.origen)
+        finally:
+            os.chdir(directorio_actual)
+    finally:
+        servidor.detener()
+
+    return medidor.resumen()
+
+
+def mostrar(resumen):
+    print(f"{'Fase':<20}{'Rep.':>6}{'Centros':>9}{'p50 (ms)':>12}{'p99 (ms)':>12}{'Centros/s':>12}  Llamadas por ejecución")
+    for fase, datos in resumen.items():
+        llamadas = ", ".join(f"{nombre}={valor:g}" for nombre, valor in datos["llamadas_por_ejecucion"].items()) or "-"
+        centros_por_s = f"{datos['centros_por_s']:.1f}" if datos["centros_por_s"] is not None else "-"
+        print(f"{fase:<20}{datos['repeticiones']:>6}{datos['elementos']:>9}{datos['p50_ms']:>12.2f}{datos['p99_ms']:>12.2f}"
+              f"{centros_por_s:>12}  {llamadas}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark sin conexión con las APIs de la Junta y de Google Maps simuladas.")
+    parser.add_argument("--fixture", default=FIXTURE_POR_DEFECTO, help="Listado de centros (CSV o xlsx) con el que se alimenta la API falsa")
+    parser.add_argument("--copias", type=int, default=1, help="Veces que se replica el listado para simular un conjunto de datos mayor")
+    parser.add_argument("--origen", default=ORIGEN_POR_DEFECTO, help="Dirección de origen de las rutas")
+    parser.add_argument("--repeticiones", type=int, default=20, help="Repeticiones de las fases rápidas")
+    parser.add_argument("--repeticiones-rutas", type=int, default=3, help="Repeticiones de las fases con la caché de rutas vacía")
+    parser.add_argument("--latencia-google", type=float, default=0.0, help="Segundos de latencia de cada respuesta de Google Maps")
+    parser.add_argument("--latencia-junta", type=float, default=0.0, help="Segundos de latencia de cada página de datastore_search")
+    parser.add_argument("--tasa-errores", type=float, default=0.0, help="Probabilidad de NOT_FOUND por elemento de Distance Matrix")
+    parser.add_argument("--tasa-errores-http", type=float, default=0.0, help="Probabilidad de error 500 por petición a Distance Matrix")
+    parser.add_argument("--qps", type=int, default=1000, help="Límite de consultas por segundo a Google Maps (GOOGLE_MAPS_QPS)")
+    parser.add_argument("--json", default=None, help="Guardar el resumen en este fichero para compararlo con otras ejecuciones")
+    argumentos = parser.parse_args()
+
+    resumen = ejecutar(argumentos)
+    mostrar(resumen)
+    if argumentos.json:
+        with open(argumentos.json, "w", encoding="utf-8") as fichero:
+            json.dump({"parametros": vars(argumentos), "fases": resumen}, fichero, ensure_ascii=False, indent=2)
+        print(f"Resumen guardado en '{argumentos.json}'")
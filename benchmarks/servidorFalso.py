@@ -0,0 +1,210 @@
+# Servidor HTTP local que sustituye a la API de la Junta de Andalucía y a Google Maps en los benchmarks.
+# Responde a datastore_search / resource_show (CKAN) con los centros de un fichero de ejemplo y a
+# Distance Matrix / Geocoding con resultados sintéticos, con latencia y tasa de errores configurables.
+
+import hashlib
+import json
+import math
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pandas as pd
+
+# Centro aproximado de cada provincia, para repartir las coordenadas sintéticas
+CENTROS_PROVINCIA = {
+    "almeria": (37.05, -2.30), "cadiz": (36.45, -5.85), "cordoba": (37.85, -4.80), "granada": (37.25, -3.35),
+    "huelva": (37.50, -6.80), "jaen": (37.95, -3.45), "malaga": (36.80, -4.60), "sevilla": (37.40, -5.80),
+}
+
+# Programas que se reparten al azar en la columna ESO (el fichero de ejemplo no la trae)
+PROGRAMAS_ESO = ["BIL ING", "PLURIL ING/FRA", "BIL ING + PLURIL ING/FRA", "PLURIL FRA/ING", "NO", None]
+
+# Correspondencia entre las columnas del CSV exportado y los campos de datastore_search
+COLUMNAS_FIXTURE = {
+    "Código Centro": "codigo", "Tipo Centro": "D_DENOMINA", "Nombre Centro": "D_ESPECIFICA",
+    "Público/Privado": "D_TIPO", "Dirección": "D_DOMICILIO", "Código Postal": "C_POSTAL",
+    "Municipio": "D_MUNICIPIO", "Provincia": "D_PROVINCIA",
+}
+
+
+def cargar_registros(ruta, copias=1, semilla=0):
+    """
+    Construye los registros de datastore_search a partir de un listado exportado (CSV o xlsx).
+
+    Args:
+        ruta (str): Fichero con las columnas de COLUMNAS_FIXTURE
+        copias (int): Número de veces que se replica el listado, con códigos distintos,
+                      para simular un conjunto de datos mayor
+        semilla (int): Semilla para repartir los programas bilingües
+
+    Returns:
+        list: Registros con los mismos campos que devuelve la API de la Junta
+    """
+    df = pd.read_excel(ruta) if ruta.endswith(".xlsx") else pd.read_csv(ruta, encoding="utf-8-sig")
+    df = df[list(COLUMNAS_FIXTURE)].rename(columns=COLUMNAS_FIXTURE).astype(str)
+    aleatorio = random.Random(semilla)
+
+    registros = []
+    for copia in range(copias):
+        for fila in df.to_dict("records"):
+            registro = dict(fila)
+            if copia:
+                registro["codigo"] = f"{fila['codigo']}-{copia}"
+                registro["D_DOMICILIO"] = f"{fila['D_DOMICILIO']} ({copia})"
+            registro["ESO"] = aleatorio.choice(PROGRAMAS_ESO)
+            registro["_id"] = len(registros) + 1
+            registros.append(registro)
+    return registros
+
+
+def _sin_tildes(texto):
+    return texto.strip().lower().translate(str.maketrans("áéíóú", "aeiou"))
+
+
+def coordenadas_sinteticas(direccion):
+    """Coordenadas deterministas para una dirección: centro de su provincia más un desplazamiento fijo."""
+    provincia = _sin_tildes(direccion.rsplit(",", 1)[-1])
+    lat, lng = CENTROS_PROVINCIA.get(provincia, CENTROS_PROVINCIA["granada"])
+    huella = hashlib.md5(direccion.encode("utf-8")).digest()
+    return lat + (huella[0] / 255 - 0.5) * 0.8, lng + (huella[1] / 255 - 0.5) * 1.0
+
+
+def _texto_duracion(segundos):
+    minutos = max(1, round(segundos / 60))
+    return f"{minutos // 60} h {minutos % 60} min" if minutos >= 60 else f"{minutos} min"
+
+
+class _Manejador(BaseHTTPRequestHandler):
+    # El servidor al que pertenece el manejador guarda la configuración y los contadores
+    def log_message(self, formato, *args):
+        pass
+
+    def _responder(self, estado, cuerpo):
+        datos = json.dumps(cuerpo, ensure_ascii=False).encode("utf-8")
+        self.send_response(estado)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(datos)))
+        self.end_headers()
+        self.wfile.write(datos)
+
+    def do_GET(self):
+        falso = self.server.falso
+        url = urlparse(self.path)
+        params = {clave: valores[0] for clave, valores in parse_qs(url.query).items()}
+        ruta = url.path.rstrip("/")
+
+        if ruta.endswith("/datastore_search"):
+            falso.contar("datastore_search")
+            time.sleep(falso.latencia_junta)
+            self._responder(200, {"success": True, "result": falso.datastore_search(params)})
+        elif ruta.endswith("/resource_show"):
+            falso.contar("resource_show")
+            self._responder(200, {"success": True, "result": {"id": params.get("id"), "last_modified": falso.version}})
+        elif ruta == "/maps/api/distancematrix/json":
+            falso.contar("distance_matrix")
+            falso.contar("elementos", len(params["origins"].split("|")) * len(params["destinations"].split("|")))
+            time.sleep(falso.latencia_google)
+            if falso.fallo_http():
+                falso.contar("errores_http")
+                self._responder(500, {"status": "UNKNOWN_ERROR"})
+                return
+            self._responder(200, falso.distance_matrix(params["origins"].split("|"), params["destinations"].split("|")))
+        elif ruta == "/maps/api/geocode/json":
+            falso.contar("geocode")
+            time.sleep(falso.latencia_google)
+            lat, lng = coordenadas_sinteticas(params["address"])
+            self._responder(200, {"status": "OK", "results": [{"geometry": {"location": {"lat": lat, "lng": lng}}}]})
+        else:
+            self._responder(404, {"success": False})
+
+
+class ServidorFalso:
+    """
+    Sustituto local de las APIs de la Junta y de Google Maps.
+
+    Args:
+        registros (list): Registros que devuelve datastore_search (ver `cargar_registros`)
+        latencia_google (float): Segundos de espera en cada respuesta de Google Maps
+        latencia_junta (float): Segundos de espera en cada página de datastore_search
+        tasa_errores (float): Probabilidad de que un elemento de Distance Matrix venga como NOT_FOUND
+        tasa_errores_http (float): Probabilidad de que una petición a Distance Matrix devuelva un 500
+        semilla (int): Semilla de los errores aleatorios
+        version (str): Fecha de última modificación que informa resource_show
+    """
+
+    def __init__(self, registros, latencia_google=0.0, latencia_junta=0.0, tasa_errores=0.0,
+                 tasa_errores_http=0.0, semilla=0, version="2024-11-11T00:00:00"):
+        self.registros = registros
+        self.latencia_google = latencia_google
+        self.latencia_junta = latencia_junta
+        self.tasa_errores = tasa_errores
+        self.tasa_errores_http = tasa_errores_http
+        self.version = version
+        self.contadores = {}
+        self._aleatorio = random.Random(semilla)
+        self._lock = threading.Lock()
+        self._servidor = None
+
+    def contar(self, nombre, cantidad=1):
+        with self._lock:
+            self.contadores[nombre] = self.contadores.get(nombre, 0) + cantidad
+
+    def fallo_http(self):
+        with self._lock:
+            return self._aleatorio.random() < self.tasa_errores_http
+
+    def _fallo_elemento(self):
+        with self._lock:
+            return self._aleatorio.random() < self.tasa_errores
+
+    def datastore_search(self, params):
+        # Mismo contrato que CKAN: filtros exactos, búsqueda libre y paginación con offset/limit
+        registros = self.registros
+        if params.get("filters"):
+            filtros = json.loads(params["filters"])
+            registros = [r for r in registros if all(str(r.get(campo)) == str(valor) for campo, valor in filtros.items())]
+        if params.get("q"):
+            texto = params["q"].lower()
+            registros = [r for r in registros if any(texto in str(valor).lower() for valor in r.values())]
+        offset = int(params.get("offset", 0))
+        limit = int(params.get("limit", 100))
+        return {"records": registros[offset:offset + limit], "total": len(registros)}
+
+    def distance_matrix(self, origenes, destinos):
+        # Distancia por carretera ~1,3 veces la distancia en línea recta a una media de 70 km/h
+        filas = []
+        for origen in origenes:
+            lat_o, lng_o = coordenadas_sinteticas(origen)
+            elementos = []
+            for destino in destinos:
+                if self._fallo_elemento():
+                    elementos.append({"status": "NOT_FOUND"})
+                    continue
+                lat_d, lng_d = coordenadas_sinteticas(destino)
+                dlat, dlng = math.radians(lat_d - lat_o), math.radians(lng_d - lng_o)
+                a = math.sin(dlat / 2) ** 2 + math.cos(math.radians(lat_o)) * math.cos(math.radians(lat_d)) * math.sin(dlng / 2) ** 2
+                km = 2 * 6371.0 * math.asin(math.sqrt(a)) * 1.3
+                segundos = int(km / 70 * 3600) + 60
+                elementos.append({
+                    "status": "OK",
+                    "distance": {"text": f"{km:.1f} km".replace(".", ","), "value": int(km * 1000)},
+                    "duration": {"text": _texto_duracion(segundos), "value": segundos},
+                })
+            filas.append({"elements": elementos})
+        return {"status": "OK", "origin_addresses": origenes, "destination_addresses": destinos, "rows": filas}
+
+    def iniciar(self, puerto=0):
+        """Arranca el servidor en un hilo y devuelve su URL base (http://127.0.0.1:puerto)."""
+        self._servidor = ThreadingHTTPServer(("127.0.0.1", puerto), _Manejador)
+        self._servidor.daemon_threads = True
+        self._servidor.falso = self
+        threading.Thread(target=self._servidor.serve_forever, daemon=True).start()
+        return f"http://127.0.0.1:{self._servidor.server_address[1]}"
+
+    def detener(self):
+        if self._servidor is not None:
+            self._servidor.shutdown()
+            self._servidor.server_close()